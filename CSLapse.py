@@ -1,124 +1,64 @@
 from __future__ import annotations
 import sys
-import subprocess
-from datetime import datetime
 from pathlib import Path
+from datetime import timedelta
 import threading
+import multiprocessing
 import concurrent.futures
 from typing import List, Tuple, Any, Callable
 from shutil import rmtree
 import logging
-import logging.config
-import logging.handlers
-import cv2
 import tkinter
 from tkinter import ttk
 from tkinter import filedialog
 from tkinter import messagebox
-from PIL import ImageTk, Image
 from functools import wraps
+from typing import TYPE_CHECKING
 
 from modules import constants
 from modules.filemanager import resource_path
 from modules import settings
 from modules import contentframe
 from modules import dialogs
+from modules import renderqueue
+from modules import messages
+from modules import logs
+from modules.exporter import Exporter, Export_job, Export_listener, Overlay, AbortException, timestamp, parse_aspect_ratio
 
-# Suggestions for any sort of improvement are welcome.
-
-# TODO: Separate Exporter into a module with all exporting tasks
-
-
-class AbortException(Exception):
-    pass
-
-
-class ExportError(Exception):
-    pass
-
-
-def get_logger_config_dict(debug: bool = False) -> dict:
-    """Return the logger configuration dictionary."""
-    dictionary = {
-        "version": 1,
-        "formatters": {
-            "basic": {
-                "format": "%(asctime)s %(levelname)s [%(name)s/%(threadName)s] %(message)s",
-                "datefmt": "%Y-%m-%d %H:%M:%S"
-            },
-            "debug": {
-                "format": "%(levelname)s  [%(name)s/%(threadName)s] %(message)s"
-            }
-        },
-        "handlers": {
-            "logfile": {
-                "class": "logging.handlers.RotatingFileHandler",
-                "level": logging.INFO,
-                "formatter": "basic",
-                "filename": "./cslapse.log",
-                "maxBytes": 200000,
-                "backupCount": 1
-            }
-        },
-        "loggers": {
-            "app": {
-                "level": logging.INFO,
-                "handlers": ["logfile"]
-            },
-            "root": {
-                "level": logging.INFO,
-                "handlers": ["logfile"]
-            },
-            "exporter": {
-                "level": logging.INFO,
-                "handlers": ["logfile"]
-            },
-            "window": {
-                "level": logging.INFO,
-                "handlers": ["logfile"]
-            },
-            "xmlparser": {
-                "level": logging.DEBUG,
-                "handlers": ["logfile"]
-            }
-        }
-    }
-
-    if debug:
-        dictionary["handlers"]["debugfile"] = {
-            "class": "logging.handlers.RotatingFileHandler",
-            "level": logging.DEBUG,
-            "formatter": "debug",
-            "filename": "./debug.log",
-        }
+if TYPE_CHECKING:
+    # Imported on demand to keep the startup fast
+    from PIL import Image
 
-    return dictionary
+# Suggestions for any sort of improvement are welcome.
 
 
 class Thread_collector(threading.Thread):
     """Cancel and join all running threads and futures except for threads in keep_alive.
 
-    Optionally count finished threads so far in counter
+    Futures that could not be cancelled are waited for,
+    as they may run on threads that are kept alive.
+    Optionally report the number of finished threads so far to counter
     """
 
     def __init__(self,
                  keep_alive: List[threading.Thread],
                  futures: List[concurrent.futures.Future] = None,
-                 counter: tkinter.IntVar = None,
+                 counter: Callable[[int], None] = None,
                  callback: Callable[[], None] = None
                  ):
         threading.Thread.__init__(self)
 
         self.log = logging.getLogger("root")
         self._counter = counter
-        if self._counter is not None:
-            self._counter.set(0)
+        self._collected = 0
         self._callback = callback
 
         # Cancel what you can, the rest will be collected
+        self._garbage_futures = []
         if futures is not None:
             for future in futures:
-                future.cancel()
+                if not future.cancel():
+                    self._garbage_futures.append(future)
 
         self._garbage_threads = list(filter(
             lambda t: t not in [*keep_alive, threading.current_thread()],
@@ -129,35 +69,34 @@ class Thread_collector(threading.Thread):
 
     def total(self) -> int:
         """Returns total number of threads and futures to cancel."""
-        return len(self._garbage_threads)
+        return len(self._garbage_threads) + len(self._garbage_futures)
 
     def run(self) -> None:
         self.log.info("Threadcollector started.")
+        for future in self._garbage_futures:
+            concurrent.futures.wait([future])
+            self._count()
         for t in self._garbage_threads:
             t.join()
-            if self._counter is not None:
-                self._counter.set(self._counter.get() + 1)
+            self._count()
         if self._callback is not None:
             self._callback()
         self.log.info("Threadcollector finished.")
         return
 
-
-def timestamp() -> str:
-    """Return a timestamp in format hhmmss."""
-    return str(datetime.now()).split(" ")[-1].split(".")[0].replace(":", "")
+    def _count(self) -> None:
+        """Report one more collected thread or future to the counter."""
+        self._collected += 1
+        if self._counter is not None:
+            self._counter(self._collected)
 
 
 class events:
-    """Namespace containing threading events used by the application."""
+    """Namespace containing threading events used by the application.
+
+    Changes the GUI has to react to are sent through App.messages instead.
+    """
     abort = threading.Event()
-    preview_loaded = threading.Event()
-    preview_load_error = threading.Event()
-    threads_collected = threading.Event()
-    export_started = threading.Event()
-    image_files_exported = threading.Event()
-    exporting_done = threading.Event()
-    abort_finished = threading.Event()
     close = threading.Event()
 
 
@@ -207,6 +146,51 @@ def ask_save_settings(function: Callable):
     return wrapper
 
 
+class Gui_listener(Export_listener):
+    """Export_listener forwarding the progress of the exporter to the GUI."""
+
+    def __init__(self, messages: messages.Message_queue):
+        self.messages = messages
+
+    def event(self, name: str, *args) -> None:
+        """Post the event to be handled on the main thread."""
+        self.messages.post(name, *args)
+
+    def estimate(self, stage: str, per_minute: float, seconds_left: float) -> None:
+        """Update the throughput and time left shown for the stage."""
+        self.messages.progress(
+            f"{stage}_eta", f"{per_minute:.1f} / min, {timedelta(seconds=round(seconds_left))} left")
+
+    def progress(self, stage: str, done: int, total: int) -> None:
+        """Update the progress variable of the stage.
+
+        The number of files to scan is not known in advance, so scanning is shown in percents.
+        Hashing the files shares the progress bar of scanning.
+        """
+        if stage in ["scanning", "hashing"]:
+            self.messages.progress(
+                "scanning_done", 100 * done // total if total else 0)
+        else:
+            self.messages.progress(f"{stage}_done", done)
+
+    def ask_retry(self, message: str) -> bool:
+        """Ask the user whether to retry on the main thread and wait for the answer.
+
+        Return False without an answer if the application is aborting or closing.
+        """
+        if threading.current_thread() is threading.main_thread():
+            return dialogs.ask_non_fatal_error(message)
+        answer = concurrent.futures.Future()
+        self.messages.post("ask_retry", message, answer)
+        while True:
+            try:
+                return answer.result(timeout=constants.ASK_RETRY_POLL_INTERVAL)
+            except concurrent.futures.TimeoutError:
+                if events.abort.is_set() or events.close.is_set():
+                    answer.cancel()
+                    return False
+
+
 class App():
     """Class overlooking everything - the gui, the variables, the constants and more."""
 
@@ -217,8 +201,8 @@ class App():
         """Clean up after the object"""
         if self.exporter.temp_folder is not None and self.exporter.temp_folder.exists():
             rmtree(self.exporter.temp_folder, ignore_errors=True)
-        collector = Thread_collector(
-            [threading.current_thread()], counter=self.vars["thread_collecting"])
+        self.renderer.shutdown()
+        collector = Thread_collector([threading.current_thread(), *logs.threads()])
         collector.start()
         collector.join()
         self.log.info("Cleanup after App done")
@@ -229,7 +213,7 @@ class App():
         self.log = logging.getLogger("app")
         self.root = tkinter.Tk()
         self.root.event_add('<<Abort>>', '<Control-C>')
-        self.root.bind('<<Abort>>', lambda event: events.abort.set())
+        self.root.bind('<<Abort>>', lambda event: self.abort_requested())
         self.root.protocol("WM_DELETE_WINDOW", self.close_pressed)
         self.vars = {
             "exe_file": tkinter.StringVar(value=constants.NO_FILE_TEXT),
@@ -240,20 +224,40 @@ class App():
             "threads": tkinter.IntVar(value=constants.DEFAULT_THREADS),
             "retry": tkinter.IntVar(value=constants.DEFAULT_RETRY),
             "rotation": tkinter.StringVar(value=constants.ROTA_OPTIONS[0]),
+            "aspect_ratio": tkinter.StringVar(value=constants.ASPECT_OPTIONS[0]),
+            "offset": tkinter.DoubleVar(value=0.0),
             "areas": tkinter.StringVar(value=constants.DEFAULT_AREAS),
             "video_length": tkinter.IntVar(value=0),
+            "steady_pace": tkinter.BooleanVar(value=False),
+            "speed_ramp": tkinter.BooleanVar(value=False),
+            "interpolate": tkinter.IntVar(value=1),
+            "show_date": tkinter.BooleanVar(value=False),
+            "draft": tkinter.BooleanVar(value=False),
+            "progressive": tkinter.BooleanVar(value=False),
+            "progress_video": tkinter.StringVar(value=""),
+            "title": tkinter.StringVar(value=""),
+            "scanning_done": tkinter.IntVar(value=0),
             "exporting_done": tkinter.IntVar(value=0),
             "rendering_done": tkinter.IntVar(value=0),
+            "exporting_eta": tkinter.StringVar(value=""),
+            "rendering_eta": tkinter.StringVar(value=""),
             "thread_collecting": tkinter.IntVar(value=0),
             "preview_source": ""
         }
         callbacks = self.register_callbacks()
+        self.messages = messages.Message_queue(
+            self.root, self.register_message_handlers(), self.set_progress)
 
-        self.exporter = Exporter(self.lock)
+        self.renderer = renderqueue.Render_queue(self.vars["threads"].get())
+        self.exporter = Exporter(self.lock, self.renderer, events.abort)
+        self.exporter.subscribe(Gui_listener(self.messages))
         self.window = CSLapse_window(self.root, self.vars, callbacks)
         self.preview = self.window.get_preview()
-
-        self.root.after(0, self._check_thread_events)
+        self.vars["rotation"].trace_add(
+            "write", lambda *args: self.preview.set_rotation(self.get_rotation()))
+        for name in ["aspect_ratio", "offset"]:
+            self.vars[name].trace_add("write", lambda *args: self.preview.set_framing(
+                parse_aspect_ratio(self.vars["aspect_ratio"].get()), self.vars["offset"].get()))
 
         self.log.info("App object initiated.")
 
@@ -261,39 +265,82 @@ class App():
         """Placeholder function, do nothing."""
         pass
 
-    def _check_thread_events(self) -> None:
-        """Check if the threading events are set, repeat after 100 ms."""
-        if events.preview_loaded.is_set():
-            events.preview_loaded.clear()
-            self.window.set_state("preview_loaded")
-        if events.preview_load_error.is_set():
-            events.preview_load_error.clear()
-            self.window.set_state("preview_load_error")
-        if events.abort.is_set():
-            if not self.exporter.is_aborting:
-                self.abort()
-        if events.threads_collected.is_set():
-            events.threads_collected.clear()
-            self.window.set_state("defaultState")
-        if events.export_started.is_set():
-            events.export_started.clear()
-            self.window.set_export_limit(int(self.vars["video_length"].get()))
-            self.window.set_state("start_export")
-        if events.image_files_exported.is_set():
-            events.image_files_exported.clear()
-            self.window.set_video_limit(
-                self.exporter.get_num_of_exported_files())
-            self.window.set_state("start_render")
-        if events.exporting_done.is_set():
-            events.exporting_done.clear()
-            self.cleanup_after_success()
-            self.window.set_state("render_done")
-            dialogs.show_info(
-                f"See your timelapse at {self.exporter.out_file}", "Video completed")
-        if events.abort_finished.is_set():
-            events.abort_finished.clear()
-            self.cleanup_after_abort()
-        self.root.after(100, self._check_thread_events)
+    def register_message_handlers(self) -> dict:
+        """Prepare the methods handling messages posted by other threads and return a dictionary containing them."""
+        handlers = {
+            "preview_loaded": self.preview_loaded,
+            "preview_load_error": lambda: self.window.set_state("preview_load_error"),
+            "abort": self.abort_requested,
+            "export_started": self.export_started,
+            "files_deduplicated": self.files_deduplicated,
+            "progress_video": self.progress_video,
+            "image_files_exported": self.image_files_exported,
+            "exporting_done": self.exporting_done,
+            "abort_finished": self.cleanup_after_abort,
+            "files_collected": self.files_collected,
+            "files_collect_error": self.files_collect_error,
+            "ask_retry": self.ask_retry
+        }
+        return handlers
+
+    def set_progress(self, name: str, value: int) -> None:
+        """Set the progress variable called name to value. Must be called on the main thread."""
+        self.vars[name].set(value)
+
+    def ask_retry(self, message: str, answer: concurrent.futures.Future) -> None:
+        """Ask the user whether to retry and set the answer for the waiting thread."""
+        if answer.set_running_or_notify_cancel():
+            answer.set_result(dialogs.ask_non_fatal_error(message))
+
+    def abort_requested(self) -> None:
+        """Start aborting unless an abort process is already running."""
+        events.abort.set()
+        if not self.exporter.is_aborting:
+            self.abort()
+
+    def export_started(self) -> None:
+        """Show the progress of searching for duplicate saves."""
+        self.vars["scanning_done"].set(0)
+        self.vars["progress_video"].set("")
+        self.vars["exporting_eta"].set("")
+        self.vars["rendering_eta"].set("")
+        self.window.set_state("start_export")
+
+    def files_deduplicated(self) -> None:
+        """Show the progress of exporting image files."""
+        self.window.set_export_limit(self.exporter.total)
+        self.window.set_state("files_deduplicated")
+
+    def progress_video(self, files: List[str]) -> None:
+        """Show where the video of the images rendered so far is."""
+        if files:
+            self.vars["progress_video"].set(
+                f"Rendered so far: {', '.join([Path(file).name for file in files])}")
+
+    def image_files_exported(self) -> None:
+        """Show the progress of rendering the video."""
+        self.window.set_video_limit(self.exporter.get_num_of_video_frames())
+        self.window.set_state("start_render")
+
+    def exporting_done(self) -> None:
+        """Clean up and notify the user after the video is completed."""
+        # Cleaning up forgets the outputs of the export
+        out_files = "\n".join(self.exporter.get_out_files())
+        summary = self.exporter.get_summary()
+        self.cleanup_after_success()
+        self.window.set_state("render_done")
+        message = f"See your timelapse at {out_files}"
+        if summary["duplicates"] > 0:
+            message += f"\n\n{summary['duplicates']} frames of unchanged saves reused."
+        if summary["cached"] > 0:
+            message += f"\n\n{summary['cached']} images of earlier drafts reused."
+        if summary["duplicates"] + summary["cached"] > 0:
+            message += f"\nAbout {summary['saved_render_hours']} hours of rendering saved."
+        if summary["frames_per_minute"] is not None:
+            message += f"\n\n{summary['frames_per_minute']} frames per minute, most time was spent on {summary['bottleneck']}."
+        if summary["report"] is not None:
+            message += f"\nTimings written to {summary['report']}"
+        dialogs.show_info(message, "Video completed")
 
     def refresh_preview(self) -> None:
         """Export the preview CSLMap file with current settings."""
@@ -307,42 +354,57 @@ class App():
         self.window.set_state("preview_loading")
 
         self.log.info("Refreshing preview started.")
-        exporter_thread = threading.Thread(
-            target=self.export_sample,
-            args=(
-                constants.SAMPLE_COMMAND[:],
-                self.exporter.get_file(self.vars["video_length"].get() - 1),
-                self.vars["width"].get(),
-                float(self.vars["areas"].get()),
-                1
-            )
+        future = self.renderer.submit(
+            self.export_sample,
+            constants.SAMPLE_COMMAND[:],
+            self.exporter.get_file(self.vars["video_length"].get() - 1),
+            self.vars["width"].get(),
+            float(self.vars["areas"].get()),
+            1,
+            priority=renderqueue.PRIORITY_INTERACTIVE
         )
-        exporter_thread.start()
+        future.add_done_callback(self._preview_done)
+
+    def _preview_done(self, future: concurrent.futures.Future) -> None:
+        """Notify the GUI about the outcome of a preview export. Called on the renderer thread."""
+        if not future.cancelled() and future.exception() is None and future.result() is not None:
+            self.messages.post("preview_loaded", *future.result())
+        else:
+            self.messages.post("preview_load_error")
 
-    @ask_retry_on_fail(on_fail=events.preview_load_error.set)
-    def export_sample(self, command: List[str], file: str, width: int, areas: float, attempts: int = 1) -> None:
+    @ask_retry_on_fail()
+    def export_sample(self, command: List[str], file: str, width: int, areas: float, attempts: int = 1) -> Tuple[Image.Image, int, float]:
         """
         Export png from the cslmap file that will be the given frame of the video.
 
-        This function should run on a separate thread.
+        This function should run on the interactive slot of the render queue.
+        Return the loaded image with the width and areas it was exported with, None if failed.
         """
+        from PIL import Image
+
         command[6] = str(width)
         command[8] = str(areas)
 
         exported = self.exporter.export_file(
             file,
             command,
-            attempts
+            attempts,
+            self.exporter.get_preview_folder()
         )
-        with self.lock:
-            self.vars["preview_source"] = Image.open(exported)
-            self.preview.justExported(
-                self.vars["preview_source"],
-                width,
-                areas,
-                float(self.vars["areas"].get())
-            )
-        events.preview_loaded.set()
+        image = Image.open(exported)
+        image.load()
+        return image, width, areas
+
+    def preview_loaded(self, image: Image.Image, width: int, areas: float) -> None:
+        """Show the newly exported preview image."""
+        self.vars["preview_source"] = image
+        self.preview.justExported(
+            image,
+            width,
+            areas,
+            float(self.vars["areas"].get())
+        )
+        self.window.set_state("preview_loaded")
 
     def open_file(self, title: str, filetypes: List[Tuple], default_directory: str = None) -> str:
         """Open file opening dialog box and return the full path to the selected file."""
@@ -360,17 +422,43 @@ class App():
         elif selected_file != "":
             self.vars["sample_file"].set(selected_file)
             self.exporter.set_sample_file(selected_file)
-            num_of_files = self.exporter.collect_raw_files(selected_file)
-            self.vars["num_of_files"].set(num_of_files)
-            if self.vars["video_length"].get() == 0:
-                self.vars["video_length"].set(num_of_files)
-            else:
-                self.vars["video_length"].set(
-                    min(self.vars["video_length"].get(), num_of_files))
-            self.refresh_preview()
+            self.vars["scanning_done"].set(0)
+            self.window.set_state("scanning")
+            threading.Thread(target=self.collect_files, args=[selected_file],
+                             name="Scanner", daemon=True).start()
         else:
             self.vars["sample_file"].set(constants.NO_FILE_TEXT)
 
+    def collect_files(self, selected_file: str) -> None:
+        """Collect the files of the selected city. Runs on its own thread."""
+        try:
+            num_of_files = self.exporter.collect_raw_files(selected_file)
+        except AbortException:
+            self.log.info("Scanning files aborted.")
+            return
+        except Exception as e:
+            self.log.exception("Scanning files failed.")
+            self.messages.post("files_collect_error", str(e))
+            return
+        self.messages.post("files_collected", num_of_files)
+
+    def files_collected(self, num_of_files: int) -> None:
+        """Show the number of collected files and refresh the preview."""
+        self.window.set_state("scanning_done")
+        self.vars["num_of_files"].set(num_of_files)
+        if self.vars["video_length"].get() == 0:
+            self.vars["video_length"].set(num_of_files)
+        else:
+            self.vars["video_length"].set(
+                min(self.vars["video_length"].get(), num_of_files))
+        self.refresh_preview()
+
+    def files_collect_error(self, message: str) -> None:
+        """Notify the user that the files of the city could not be collected."""
+        self.window.set_state("scanning_done")
+        self.vars["num_of_files"].set(0)
+        dialogs.show_warning(message)
+
     def select_exe(self) -> None:
         """Ask user to select SCLMapViewer.exe from dialog and set variables accordingly."""
         selected_file = self.open_file(
@@ -429,8 +517,12 @@ class App():
             self.log.info("Abort procedure started on main thread.")
 
             self.vars["thread_collecting"].set(0)
-            collector = Thread_collector([threading.current_thread()], self.exporter.get_futures(
-            ), counter=self.vars["thread_collecting"], callback=events.abort_finished.set)
+            collector = Thread_collector(
+                [threading.current_thread(), *self.renderer.threads(), *logs.threads()],
+                self.exporter.get_futures(),
+                counter=lambda n: self.messages.progress("thread_collecting", n),
+                callback=lambda: self.messages.post("abort_finished")
+            )
             self.window.progress_popup(
                 self.vars["thread_collecting"], collector.total())
             collector.start()
@@ -519,24 +611,47 @@ class App():
                 dialogs.show_warning(constants.texts.INVALID_THREADS_MESSAGE)
             elif not self.vars["retry"].get() > -1:
                 dialogs.show_warning(constants.texts.INVALUD_RETRY_MESSAGE)
+            elif not self.vars["interpolate"].get() > 0:
+                dialogs.show_warning(constants.texts.INVALID_INTERPOLATE_MESSAGE)
             else:
-                if not self.exporter.export(
-                    self.vars["width"].get(),
-                    self.vars["areas"].get(),
-                    self.vars["video_length"].get(),
-                    self.vars["fps"].get(),
-                    self.vars["threads"].get(),
-                    self.vars["retry"].get(),
-                    self.vars["exporting_done"],
-                    self.vars["rendering_done"]
-                ):
-                    self.showWoarning(
+                if not self.exporter.export(Export_job(
+                    width=self.vars["width"].get(),
+                    areas=float(self.vars["areas"].get()),
+                    length=self.vars["video_length"].get(),
+                    fps=self.vars["fps"].get(),
+                    threads=self.vars["threads"].get(),
+                    retry=self.vars["retry"].get(),
+                    timing="game_time" if self.vars["steady_pace"].get() else "saves",
+                    speed_ramp=constants.DEFAULT_SPEED_RAMP if self.vars["speed_ramp"].get() else 0,
+                    interpolate=self.vars["interpolate"].get(),
+                    overlays=self.get_overlays(),
+                    rotation=self.get_rotation(),
+                    aspect_ratio=self.vars["aspect_ratio"].get(),
+                    offset=self.vars["offset"].get(),
+                    draft=constants.DRAFT_FRAMES if self.vars["draft"].get() else 0,
+                    progressive=self.vars["progressive"].get()
+                )):
+                    dialogs.show_warning(
                         "An export operation is already running!")
         except Exception:
             self.log.exception("Incorrect entry data.")
             dialogs.show_warning(
                 "Something went wrong. Check your settings and try again.")
 
+    def get_rotation(self) -> int:
+        """Return the selected rotation in degrees."""
+        return int(self.vars["rotation"].get().rstrip("°"))
+
+    def get_overlays(self) -> tuple:
+        """Return the overlays selected in the GUI."""
+        overlays = []
+        if self.vars["title"].get().strip() != "":
+            overlays.append(
+                Overlay("text", self.vars["title"].get().strip(), "top-left"))
+        if self.vars["show_date"].get():
+            overlays.append(Overlay("date", position="bottom-left"))
+        return tuple(overlays)
+
     def abort_pressed(self) -> None:
         """Ask user if really wants to abort. Generate abort tkinter event if yes."""
         if messagebox.askyesno(title="Abort action?", message=constants.texts.ASK_ABORT_MESSAGE):
@@ -569,335 +684,6 @@ class App():
             self.root.destroy()
 
 
-class Exporter():
-    """Class responsible for exporting images and assembling the video from them."""
-
-    def __init__(self, lock: threading.Lock):
-        self.log = logging.getLogger("exporter")
-        self.lock = lock
-        # Path type, the directory where cslmap files are loaded from
-        self.source_directory = None
-        self.city_name = None  # string, the name of the city
-        self.temp_folder = None  # Path type, the location where temporary files are created
-        self.raw_files = []    # Collected cslmap files with matching city name
-        self.image_files = []
-        self.futures = []   # concurrent.futures.Future objects that are exporting images
-        self.is_running = False  # If currently there is exporting going on
-        self.is_aborting = False  # If an abort pre=ocess is in progress
-        self.out_file = ""  # Name of output file
-
-    def get_file(self, n: int) -> str:
-        """
-        Return the nth (0-indexed) file among the collected raw_files.
-
-        If there are not enough files, return an empty string.
-        """
-        if n >= len(self.raw_files):
-            return ""
-        else:
-            return self.raw_files[n]
-
-    def get_num_of_exported_files(self) -> int:
-        """Return the number of files exported in theis export process."""
-        with self.lock:
-            num = len(self.image_files)
-        return num
-
-    def get_futures(self) -> List[concurrent.futures.Future]:
-        """Return future objects used for export."""
-        return self.futures
-
-    def can_abort(self) -> bool:
-        """Return if the export process can be aborted."""
-        return (not self.is_aborting) and self.is_running
-
-    def set_abort(self) -> None:
-        """Set variables to start aborting."""
-        self.is_aborting = True
-        self.isRunning = False
-
-    def clear_temp_folder(self) -> None:
-        """
-        Remove the all files from self.temp_folder, create Directory if doesn't exist.
-
-        If temp_folder is None, or doesnt exist, create the folder and return.
-        If a file can not be removed, show a warning.
-        If an other issue comes up: 
-        """
-        while 1:
-            try:
-                with self.lock:
-                    if self.temp_folder.exists():
-                        rmtree(self.temp_folder, ignore_errors=False)
-                    self.temp_folder.mkdir()
-                self.log.info("Tempfolder cleared or created successfully.")
-                return
-            except Exception as e:
-                self.log.exception(
-                    "Error while clearing / creating temp_folder.")
-                if not dialogs.ask_fatal_error(str(e)):
-                    raise
-
-    def set_sample_file(self, sample: str) -> None:
-        """Store city name and location of the sample file."""
-        sample_file = Path(sample)
-        self.source_directory = sample_file.parent
-        self.temp_folder = Path(self.source_directory, f"temp-{timestamp()}")
-        self.city_name = sample_file.stem.split("-")[0]
-        self.clear_temp_folder()
-
-    def set_exefile(self, exefile: str) -> None:
-        """Set the executable used for exporting to exefile."""
-        self.exefile = exefile
-
-    def collect_raw_files(self, filename: str) -> int:
-        """Make an array of files whose name matches the city's name and return its length."""
-        self.raw_files = sorted(
-            filter(
-                lambda filename:
-                    filename.name not in [
-                        f"{self.city_name}.cslmap", f"{self.city_name}.cslmap.gz"]
-                    and filename.name.startswith(self.city_name)
-                    and ".cslmap" in filename.suffixes,
-                self.source_directory.iterdir()
-            ))
-        return len(self.raw_files)
-
-    def export_file(self, source_file: str, cmd: List[str], retry: int) -> str:
-        """Call CSLMapView to export one image file and return outfile's name.
-
-        Exceptions:
-            Abortexpression: propagates
-            Cannot export file after [retry] tries: raises ExportError
-        """
-
-        # Prepare command that calls cslmapview.exe
-        new_file_name = Path(self.temp_folder, source_file.stem.encode(
-            "ascii", "ignore").decode()).with_suffix(".png")
-        cmd[1] = str(source_file)
-        cmd[3] = str(new_file_name)
-
-        self.log.info(f"Export of file '.../{source_file.name}' 'started")
-
-        # call CSLMapview.exe to export the image. Try again at fail, abort after many tries.
-        for n in range(retry):
-            try:
-                # Call the program in a separate process
-                subprocess.run(cmd, shell=False, stderr=subprocess.DEVNULL,
-                               stdout=subprocess.DEVNULL, check=False)
-
-                # Return prematurely on abort
-                # Needs to be after export command, otherwise won't work. Probably dead Lock.
-                if events.abort.is_set():
-                    raise AbortException("Abort initiated on another thread.")
-
-                # Ensure that the image file was successfully created.
-                assert new_file_name.exists()
-
-                self.log.info(
-                    f"Successfully exported file '.../{new_file_name.name}' after {n+1} attempts.")
-                return str(new_file_name)
-            except AbortException as error:
-                self.log.exception(
-                    f"Aborted while exporting file '{new_file_name}'.")
-                raise AbortException from error
-            except subprocess.CalledProcessError as e:
-                self.log.exception(
-                    f"Process error while exporting file '{new_file_name}'.")
-                pass
-            except AssertionError as e:
-                self.log.warning(
-                    f"File '{new_file_name}' does not exist after exporting.")
-                pass
-            except Exception as e:
-                self.log.exception(
-                    f"Unknown exception while exporting file '{new_file_name}'.")
-                pass
-
-        self.log.warning(
-            f"Failed to export file after {retry} attempts with command '{' '.join(cmd)}'")
-
-        # Throw exception after repeatedly failing
-        raise ExportError(str('Could not export file.\nCommand: "'
-                              + ' '.join(cmd)
-                              + '"\nThis problem might arise normally, usually when resources are taken.'))
-
-    def export(self, width: int, areas: float, length: int, fps: int, threads: int, retry: int, image_files_counter: tkinter.IntVar, video_counter: tkinter.IntVar) -> bool:
-        """Start exporting and return True if possible, False if exporting is already running."""
-        if self.is_running or self.is_aborting:
-            return False
-        self.prepare(image_files_counter, video_counter)
-        threading.Thread(
-            target=self.run,
-            args=(
-                width,
-                areas,
-                length,
-                fps,
-                threads,
-                retry,
-                image_files_counter,
-                video_counter
-            ),
-            daemon=True
-        ).start()
-        return True
-
-    def prepare(self, image_files_counter: tkinter.IntVar, video_counter: tkinter.IntVar) -> None:
-        """Prepare variables and environment for exporting."""
-        self.log.info(f"Exporting process initiated.")
-        self.is_running = True
-        self.is_aborting = False
-        events.abort.clear()
-        self.clear_temp_folder()
-        self.image_files = []
-        self.futures = []
-        image_files_counter.set(0)
-        video_counter.set(0)
-
-    def run(self, width: int, areas: float, length: int, fps: int, threads: int, retry: int, image_files_var: tkinter.IntVar, video_var: tkinter.IntVar) -> None:
-        """Export images and create video from them.
-
-        Exceptions:
-            Starting second export: warning
-            AbortException: return
-        """
-        try:
-            events.export_started.set()
-            self.log.info("Exporting image files started.")
-            self.export_image_files(
-                width, areas, length, threads, retry, image_files_var)
-            self.log.info("Exporting image files finished.")
-            events.image_files_exported.set()
-            self.log.info("Rendering video started.")
-            self.render_video(width, fps, video_var)
-            self.log.info("Rendering video finished.")
-            events.exporting_done.set()
-        except AbortException as e:
-            events.abort.set()
-            self.log.exception("Aborting export process due to AbortException")
-            raise
-
-    def export_image_files(self, width: int, areas: float, length: int, threads: int, retry: int, progress_variable: tkinter.IntVar) -> None:
-        """Call CSLMapView to export the collected cslmap files one-by-one on separate threads.
-
-        Exceptions:
-            Raise AbortException if abort is requested
-        """
-        cmd = [
-            self.exefile,
-            "__source_file__",
-            "-output",
-            "__outFile__",
-            "-silent",
-            "-imagewidth",
-            str(width),
-            "-area",
-            str(areas)
-        ]
-
-        with concurrent.futures.ThreadPoolExecutor(threads) as executor:
-            for i in range(length):
-                self.futures.append(
-                    executor.submit(
-                        self.export_image, self.raw_files[i], cmd[:], retry, progress_variable)
-                )
-        if events.abort.is_set():
-            raise AbortException("Abort initiated on another thread.")
-
-        # Sort array as the order might have changed during threading
-        self.image_files = sorted(self.image_files)
-
-    @ask_retry_on_fail()
-    def export_image(self, source: str, cmd: List[str], retry: int, progress_variable: tkinter.IntVar) -> None:
-        """Call the given command to export the given image, add filename to self.imageFiles.
-
-        This function should run on a separate thread for each file.
-
-        Exceptions:
-            AbortException: propagate
-            ExportError: non-fatal
-            Other exceptions: non-fatal
-        """
-        new_file_name = self.export_file(source, cmd, retry)
-        with self.lock:
-            self.image_files.append(new_file_name)
-            progress_variable.set(progress_variable.get() + 1)
-
-    @ask_retry_on_fail(events.abort.set)
-    def prepare_video_file(self, width: int, fps: int, out_file: Path = None) -> cv2.VideoWriter:
-        """Create the video file with the required parameters."""
-        return cv2.VideoWriter(
-            self.out_file,
-            cv2.VideoWriter_fourcc(*"mp4v"),
-            fps,
-            (width, width)
-        )
-
-    def render_video(self, width: int, fps: int, progress_variable: tkinter.IntVar, out_file: Path = None) -> None:
-        """Create an mp4 video file from all the exported images.
-
-        Exceptions:
-            Raise AbortException if abort is requested
-            AbortException: propagate
-            Cannot open video file: raise AbortException
-            Cannot add image to video: non-fatal
-        """
-        self.out_file = out_file if out_file is not None else str(Path(
-            self.source_directory, f'{self.city_name.encode("ascii", "ignore").decode()}-{timestamp()}.mp4'))
-
-        out = self.prepare_video_file(width, fps, out_file)
-
-        try:
-            i = 0
-            while i < len(self.image_files):
-                if events.abort.is_set():
-                    raise AbortException("Abort initiated on another thread.")
-                try:
-                    img = cv2.imread(self.image_files[i])
-                    out.write(img)
-                    with self.lock:
-                        progress_variable.set(progress_variable.get() + 1)
-                    i += 1
-                except AbortException as e:
-                    self.log.exception(
-                        "Aborted rendering video due to AbortException.")
-                    raise AbortException from e
-                except cv2.error as e:
-                    # For some reason it still cannot catch cv2 errors
-                    if not dialogs.ask_non_fatal_error(str(e)):
-                        i += 1
-                        self.log.exception(
-                            f"Skipping image '{self.imageFiles[i]}' after cv2 Exception.")
-                    else:
-                        self.log.warning(
-                            f"Retrying adding image '{self.image_files[i]}' to video after cv2 Exception.")
-                except Exception as e:
-                    if not dialogs.ask_non_fatal_error(str(e)):
-                        i += 1
-                        self.log.warning(
-                            f"Skipping image '{self.imageFiles[i]}' after unknow Exception.")
-                    else:
-                        self.log.warning(
-                            f"Retrying adding image '{self.image_files[i]}' to video after unknown Exception.")
-        except AbortException as e:
-            self.log.exception(
-                "Aborted rendering video due to AbortException.")
-            raise AbortException from e
-        finally:
-            out.release()
-            self.log.info(f"Released video file '{self.out_file}'")
-
-    def cleanup(self) -> None:
-        """Clean up after exporting and/or aborting."""
-        self.clear_temp_folder()
-        self.image_files = []
-        self.futures = []
-        self.is_running = False
-        self.is_aborting = False
-        self.log.info("Successful cleanup after export or abort.")
-
-
 class CSLapse_window():
 
     def __init__(self, root: tkinter.Toplevel, vars: dict, callbacks: dict):
@@ -995,9 +781,6 @@ class CSLapse_window():
 
 def main() -> None:
     log = logging.getLogger("root")
-    log.info("")
-    log.info("-"*50)
-    log.info("")
     log.info(f"CSLapse started with working directory '{current_directory}'.")
     try:
         with App() as app:
@@ -1009,10 +792,15 @@ def main() -> None:
 
 
 if __name__ == "__main__":
+    # Metadata of the saves is read in a process pool, needed for PyInstaller
+    multiprocessing.freeze_support()
     debug = False
     gettrace = getattr(sys, 'gettrace', None)
     if gettrace is not None and gettrace():
         debug = True
-    logging.config.dictConfig(get_logger_config_dict(debug))
+    listener = logs.start(debug)
     current_directory = Path(__file__).parent.resolve()
-    main()
+    try:
+        main()
+    finally:
+        listener.stop()
@@ -0,0 +1,359 @@
+"""
+Benchmark of the export pipeline, run against a stub CSLMapView.
+
+Creates the saves of a synthetic city in a temporary directory and measures:
+    - scanning the directory, without and with its index
+    - rendering the saves on the render queue with different numbers of threads
+    - decoding the rendered images
+    - encoding the decoded images into a video
+    - complete exports at several widths and numbers of frames
+    - logging from the worker threads, straight to a file and through the queue of the application
+
+The stub (stub_cslmapview.py) takes the place of CSLMapView. Its latency, memory use,
+failure rate and hang rate are set with the options, so the cost of slow or failing
+renders can be measured as well. Nothing outside the temporary directory is touched.
+The stub is started as a script with a shebang line, so the benchmark runs on Linux and macOS.
+
+Prints the results as JSON. Usage:
+    python benchmarks/export.py [--saves N] [--widths 256,512] [--frames 50,200] [--latency S] ...
+"""
+
+import os
+import sys
+import json
+import time
+import stat
+import shutil
+import argparse
+import platform
+import statistics
+import tempfile
+import logging
+import logging.handlers
+import concurrent.futures
+from datetime import datetime, timedelta
+from pathlib import Path
+
+REPO = Path(__file__).parent.parent.resolve()
+sys.path.insert(0, str(REPO))
+
+from modules import constants  # noqa: E402
+from modules import logs  # noqa: E402
+from modules import renderqueue  # noqa: E402
+from modules import scanner  # noqa: E402
+from modules.exporter import Exporter, Export_job, ExportError  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+CITY = "Bench"
+AREAS = 2.0
+FPS = 30
+
+SAVE_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<CSLMap>
+  <CityName>{city}</CityName>
+  <GameTime>{date}</GameTime>
+  <Population>{population}</Population>
+  <Buildings>{buildings}</Buildings>
+</CSLMap>
+"""
+
+
+def number_list(text: str) -> list:
+    """Return the comma separated integers of text."""
+    return [int(number) for number in text.split(",")]
+
+
+def create_saves(directory: Path, count: int) -> Path:
+    """Write count saves of a growing city into directory and return the first one.
+
+    Every fifth save is identical to the one before it, like the autosaves of a paused game.
+    """
+    for i in range(count):
+        day = i - 1 if i % 5 == 4 else i
+        Path(directory, f"{CITY}-{i:05d}.cslmap").write_text(SAVE_TEMPLATE.format(
+            city=CITY,
+            date=(datetime(2000, 1, 1) + timedelta(days=day)).isoformat(),
+            population=day * 37,
+            buildings="b" * (day * 16)
+        ))
+    return Path(directory, f"{CITY}-00000.cslmap")
+
+
+def install_stub(directory: Path) -> Path:
+    """Install the stub as an executable into directory and return its path."""
+    directory.mkdir()
+    exe = Path(directory, "CSLMapViewer")
+    source = Path(REPO, "benchmarks", "stub_cslmapview.py").read_text()
+    # The stub has to run with this interpreter, the one that has NumPy
+    exe.write_text(f"#!{sys.executable}\n" + source.split("\n", 1)[1])
+    exe.chmod(exe.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    Path(directory, constants.SETTINGS_FILE_NAME).write_text(
+        "<?xml version=\"1.0\" encoding=\"utf-8\"?><Config />")
+    return exe
+
+
+def summary(samples: list) -> dict:
+    """Return statistics of the sample times in milliseconds."""
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 2),
+        "p95_ms": round(samples[int(0.95 * (len(samples) - 1))] * 1000, 2),
+        "min_ms": round(samples[0] * 1000, 2),
+        "max_ms": round(samples[-1] * 1000, 2)
+    }
+
+
+def bench_scan(directory: Path, index_folder: Path) -> dict:
+    """Measure listing the saves and reading their metadata, without and with an index."""
+    results = {}
+    shutil.rmtree(index_folder, ignore_errors=True)
+    for name in ["cold", "indexed"]:
+        start = time.perf_counter()
+        index = scanner.Directory_index(directory, index_folder)
+        index.scan()
+        index.read_metadata(index.names())
+        index.save()
+        results[f"{name}_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    results["files"] = len(index.names())
+    return results
+
+
+def bench_render(exe: Path, files: list, folder: Path, width: int, threads: int, retry: int) -> dict:
+    """Measure rendering files on the render queue with threads workers."""
+    exporter = Exporter()
+    cmd = [str(exe), "", "-output", "", "-silent",
+           "-imagewidth", str(width), "-area", str(AREAS)]
+    latencies = []
+
+    def render(file: Path) -> str:
+        start = time.perf_counter()
+        try:
+            return exporter.export_file(file, cmd[:], retry, folder)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    renderer = renderqueue.Render_queue(workers=threads)
+    start = time.perf_counter()
+    futures = [renderer.submit(render, file) for file in files]
+    concurrent.futures.wait(futures)
+    elapsed = time.perf_counter() - start
+    renderer.shutdown()
+    failed = len([future for future in futures if isinstance(future.exception(), ExportError)])
+    return {
+        "threads": threads,
+        "images": len(files),
+        "seconds": round(elapsed, 3),
+        "images_per_second": round(len(files) / elapsed, 2),
+        "failed": failed,
+        "latency": summary(latencies)
+    }
+
+
+def bench_decode(images: list) -> tuple:
+    """Measure decoding the images, return the results and the decoded frames."""
+    exporter = Exporter()
+    start = time.perf_counter()
+    decoded = list(exporter.decode(list(enumerate(images))))
+    elapsed = time.perf_counter() - start
+    return {
+        "frames": len(decoded),
+        "seconds": round(elapsed, 3),
+        "frames_per_second": round(len(decoded) / elapsed, 2) if elapsed else None
+    }, decoded
+
+
+def bench_encode(decoded: list, out_file: Path) -> dict:
+    """Measure encoding the decoded frames into out_file."""
+    import cv2
+    height, width = decoded[0].image.shape[:2]
+    out = cv2.VideoWriter(str(out_file), cv2.VideoWriter_fourcc(*"mp4v"), FPS, (width, height))
+    start = time.perf_counter()
+    for frame in decoded:
+        out.write(frame.image)
+    out.release()
+    elapsed = time.perf_counter() - start
+    return {
+        "frames": len(decoded),
+        "seconds": round(elapsed, 3),
+        "frames_per_second": round(len(decoded) / elapsed, 2) if elapsed else None,
+        "bytes": out_file.stat().st_size
+    }
+
+
+def bench_export(exe: Path, sample: Path, out_file: Path, width: int, frames: int, threads: int, retry: int) -> dict:
+    """Measure a complete export of frames saves at width."""
+    exporter = Exporter()
+    exporter.set_exefile(str(exe))
+    start = time.perf_counter()
+    exporter.set_sample_file(str(sample))
+    exporter.collect_raw_files(str(sample))
+    job = exporter.prepare(Export_job(width=width, areas=AREAS, length=frames, fps=FPS,
+                                      threads=threads, retry=retry, out_file=out_file))
+    try:
+        exporter.run(job)
+        elapsed = time.perf_counter() - start
+        exported = exporter.get_num_of_exported_files()
+        statistics = exporter.get_summary()
+        return {
+            "width": width,
+            "frames": job.length,
+            "seconds": round(elapsed, 3),
+            "frames_per_second": round(job.length / elapsed, 2),
+            "rendered": statistics["rendered"],
+            "duplicates": statistics["duplicates"],
+            "failed": exporter.total - exported,
+            "render_seconds": round(exporter.render_time, 3)
+        }
+    finally:
+        exporter.cleanup()
+        shutil.rmtree(exporter.temp_folder, ignore_errors=True)
+        exporter.renderer.shutdown()
+
+
+def bench_logging(folder: Path, threads: int, records: int) -> dict:
+    """Measure the time threads workers spend logging records structured records each.
+
+    The records are written straight to a log file from the workers,
+    then through the queue that the application logs with.
+    """
+    log = logging.getLogger("exporter")
+    folder.mkdir()
+    results = {"threads": threads, "records": threads * records}
+    logging.disable(logging.NOTSET)
+    try:
+        for name in ["direct", "queue"]:
+            if name == "direct":
+                handler = logging.handlers.RotatingFileHandler(
+                    Path(folder, "cslapse-direct.log"), maxBytes=constants.LOG_FILE_MAX_BYTES,
+                    backupCount=constants.LOG_FILE_BACKUPS, encoding="utf-8")
+                handler.setFormatter(logs.Json_formatter())
+                logging.getLogger().addHandler(handler)
+                log.setLevel(logging.INFO)
+            else:
+                listener = logs.start(folder=Path(folder, "queue"))
+            latencies = []
+
+            def work() -> None:
+                for i in range(records):
+                    start = time.perf_counter()
+                    log.info("Exported file", extra={"data": {"file": f"{CITY}-{i:05d}.cslmap", "attempts": 1}})
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+                for _ in range(threads):
+                    pool.submit(work)
+            logged = time.perf_counter() - start
+            if name == "direct":
+                logging.getLogger().removeHandler(handler)
+                handler.close()
+            else:
+                listener.stop()
+            results[name] = {
+                "call_us": round(statistics.mean(latencies) * 1e6, 2),
+                "p95_call_us": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))] * 1e6, 2),
+                "workers_seconds": round(logged, 3),
+                "written_seconds": round(time.perf_counter() - start, 3)
+            }
+    finally:
+        logging.disable(logging.CRITICAL)
+    return results
+
+
+def peak_memory() -> dict:
+    """Return the peak resident memory of this process and of the largest renderer in megabytes."""
+    if resource is None:
+        return {}
+    # Kilobytes on Linux, bytes on macOS
+    unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "benchmark_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit, 1),
+        "renderer_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit, 1)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--saves", type=int, default=200, help="number of saves created")
+    parser.add_argument("--widths", type=number_list, default=[256, 512],
+                        help="comma separated widths of the exports")
+    parser.add_argument("--frames", type=number_list, default=[50, 200],
+                        help="comma separated numbers of frames of the exports")
+    parser.add_argument("--threads", type=number_list, default=[1, 2, 4],
+                        help="comma separated numbers of render threads, the last one is used for the exports")
+    parser.add_argument("--retry", type=int, default=2, help="attempts per image")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per render")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra seconds per render")
+    parser.add_argument("--memory", type=float, default=0.0, help="megabytes used by a render")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="probability of a failed render")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="probability of a stalled render")
+    parser.add_argument("--hang", type=float, default=2.0, help="seconds a stall lasts")
+    parser.add_argument("--log-records", type=int, default=2000,
+                        help="records logged by each thread in the logging benchmark")
+    parser.add_argument("--output", type=Path, help="file to write the results to instead of stdout")
+    args = parser.parse_args()
+    # Every injected failure would be logged with its traceback
+    logging.disable(logging.CRITICAL)
+
+    stub = {"LATENCY": args.latency, "JITTER": args.jitter, "MEMORY": args.memory,
+            "FAIL_RATE": args.fail_rate, "HANG_RATE": args.hang_rate, "HANG": args.hang}
+    os.environ.update({f"CSLAPSE_STUB_{name}": str(value) for name, value in stub.items()})
+
+    results = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "saves": args.saves,
+        "stub": {name.lower(): value for name, value in stub.items()}
+    }
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        # Keep the indexes, the frame cache and the reports of the user untouched
+        constants.INDEX_FOLDER = str(Path(temp, "index"))
+        constants.FRAME_CACHE_FOLDER = str(Path(temp, "frames"))
+        constants.REPORT_FOLDER = str(Path(temp, "reports"))
+        saves = Path(temp, "saves")
+        saves.mkdir()
+        sample = create_saves(saves, args.saves)
+        exe = install_stub(Path(temp, "install"))
+
+        results["scan"] = bench_scan(saves, Path(constants.INDEX_FOLDER))
+
+        files = sorted(saves.glob(f"{CITY}-*.cslmap"))[:max(args.frames)]
+        results["render"] = []
+        for threads in args.threads:
+            folder = Path(temp, f"render-{threads}")
+            folder.mkdir()
+            results["render"].append(bench_render(
+                exe, files, folder, args.widths[0], threads, args.retry))
+
+        images = sorted(str(image) for image in Path(temp, f"render-{args.threads[-1]}").glob("*.png"))
+        if images:
+            results["decode"], decoded = bench_decode(images)
+            results["encode"] = bench_encode(decoded, Path(temp, "encode.mp4"))
+            del decoded
+
+        results["export"] = [
+            bench_export(exe, sample, Path(temp, f"export-{width}-{frames}.mp4"),
+                         width, frames, args.threads[-1], args.retry)
+            for width in args.widths for frames in args.frames
+        ]
+        results["logging"] = bench_logging(
+            Path(temp, "logs"), args.threads[-1], args.log_records)
+        results["peak_memory"] = peak_memory()
+
+    text = json.dumps(results, indent=4)
+    if args.output is not None:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark of the startup time of CSLapse.
+
+Measures, each in a fresh interpreter:
+    - the time it takes to import the application and the export engine
+      and which heavy libraries get loaded by the import
+    - the time from starting the interpreter to the first drawn window
+      (skipped if no display is available)
+
+Prints the results as JSON. Usage:
+    python benchmarks/startup.py [--repeat N]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+
+REPO = Path(__file__).parent.parent.resolve()
+HEAVY_MODULES = ["cv2", "numpy", "PIL"]
+
+# resource_path() locates the resources relative to the main script
+PRELUDE = f"""
+import sys, time, json
+start = time.perf_counter()
+import __main__
+__main__.__file__ = {str(Path(REPO, "CSLapse.py"))!r}
+"""
+
+IMPORT_CODE = PRELUDE + f"""
+import {{module}}
+elapsed = time.perf_counter() - start
+print(json.dumps({{{{"seconds": elapsed, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}}}))
+"""
+
+WINDOW_CODE = PRELUDE + """
+import CSLapse
+app = CSLapse.App()
+def shown():
+    app.root.update()
+    print(json.dumps({"seconds": time.perf_counter() - start}))
+    app.root.destroy()
+app.root.after_idle(shown)
+app.root.mainloop()
+app.renderer.shutdown()
+"""
+
+
+def run_child(code: str, cwd: str) -> dict:
+    """Run code in a new interpreter and return the JSON it printed."""
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True,
+                            text=True, env={**os.environ, "PYTHONPATH": str(REPO)})
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summary(samples: list) -> dict:
+    """Return statistics of the sample times in milliseconds."""
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 2),
+        "min_ms": round(min(samples) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {"python": sys.version.split()[0], "repeat": args.repeat}
+    with tempfile.TemporaryDirectory() as cwd:
+        for module in ["CSLapse", "modules.exporter"]:
+            runs = [run_child(IMPORT_CODE.format(module=module), cwd)
+                    for _ in range(args.repeat)]
+            results[f"import {module}"] = {
+                **summary([r["seconds"] for r in runs]),
+                "heavy_modules_loaded": runs[-1]["loaded"]
+            }
+
+        try:
+            samples = [run_child(WINDOW_CODE, cwd)["seconds"]
+                       for _ in range(args.repeat)]
+            results["time to first window"] = summary(samples)
+        except RuntimeError as e:
+            results["time to first window"] = {"skipped": str(e)}
+
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Stand-in for CSLMapView, so the export pipeline can be measured without Windows and the game.
+
+Accepts the command line CSLapse uses:
+    stub_cslmapview.py <file> -output <png> -silent -imagewidth W -area A
+and writes a synthetic map of a city, the same for the same save contents,
+with more buildings for larger saves.
+
+Its behaviour is set through environment variables, so it is inherited
+by every call the exporter makes:
+    CSLAPSE_STUB_LATENCY    seconds spent per render (default 0)
+    CSLAPSE_STUB_JITTER     random extra seconds, up to this much (default 0)
+    CSLAPSE_STUB_MEMORY     megabytes allocated while rendering (default 0)
+    CSLAPSE_STUB_FAIL_RATE  probability of exiting without an image (default 0)
+    CSLAPSE_STUB_HANG_RATE  probability of stalling before rendering (default 0)
+    CSLAPSE_STUB_HANG       seconds a stall lasts (default 30)
+"""
+
+import os
+import sys
+import time
+import zlib
+import struct
+import random
+from pathlib import Path
+
+import numpy as np
+
+EXIT_USAGE = 2
+EXIT_FAILED = 1
+
+
+def setting(name: str, default: float) -> float:
+    """Return the number in the environment variable CSLAPSE_STUB_<name>."""
+    return float(os.environ.get(f"CSLAPSE_STUB_{name}", default))
+
+
+def parse(argv: list) -> tuple:
+    """Return the save, the output, the width and the areas given on the command line."""
+    if len(argv) < 2 or argv[1].startswith("-"):
+        raise ValueError("No cslmap file given.")
+    options = {}
+    i = 2
+    while i < len(argv):
+        if argv[i] == "-silent":
+            i += 1
+        elif argv[i] in ["-output", "-imagewidth", "-area"] and i + 1 < len(argv):
+            options[argv[i]] = argv[i + 1]
+            i += 2
+        else:
+            raise ValueError(f"Unknown option: {argv[i]}")
+    if "-output" not in options:
+        raise ValueError("No output given.")
+    return (Path(argv[1]), Path(options["-output"]),
+            int(options.get("-imagewidth", 2000)), float(options.get("-area", 9.0)))
+
+
+def render(contents: bytes, width: int, areas: float) -> np.ndarray:
+    """Return a map of a city on a grid of roads, built up according to the size of the save."""
+    rng = np.random.default_rng(zlib.crc32(contents))
+    block = max(4, int(width / (areas * 6)))
+    blocks = width // block + 1
+    built = min(0.95, 0.1 + len(contents) / 4096)
+    colors = rng.integers(90, 230, (blocks, blocks, 3), dtype=np.uint8)
+    cells = np.where((rng.random((blocks, blocks)) < built)[..., np.newaxis],
+                     colors, np.array([70, 130, 80], np.uint8))
+    image = np.repeat(np.repeat(cells, block, 0), block, 1)[:width, :width]
+    roads = np.arange(width) % block < max(1, block // 8)
+    image[roads, :] = 110
+    image[:, roads] = 110
+    return np.ascontiguousarray(image)
+
+
+def write_png(path: Path, image: np.ndarray) -> None:
+    """Write the BGR image to path as a PNG file.
+
+    Encoded by hand, loading OpenCV would take longer than most renders.
+    """
+    height, width = image.shape[:2]
+    rows = np.zeros((height, width * 3 + 1), np.uint8)  # Filter type 0 in front of every row
+    rows[:, 1:] = image[..., ::-1].reshape(height, -1)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    path.write_bytes(b"\x89PNG\r\n\x1a\n"
+                     + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+                     + chunk(b"IDAT", zlib.compress(rows.tobytes(), 1))
+                     + chunk(b"IEND", b""))
+
+
+def main(argv: list) -> int:
+    try:
+        source, output, width, areas = parse(argv)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return EXIT_USAGE
+
+    if random.random() < setting("HANG_RATE", 0):
+        time.sleep(setting("HANG", 30))
+    ballast = bytearray(int(setting("MEMORY", 0) * 1024 * 1024))
+    # Touch every page, so the memory is really used
+    ballast[::4096] = b"\x01" * len(ballast[::4096])
+    time.sleep(setting("LATENCY", 0) + random.random() * setting("JITTER", 0))
+    if random.random() < setting("FAIL_RATE", 0):
+        return EXIT_FAILED
+
+    try:
+        write_png(output, render(source.read_bytes(), width, areas))
+    except OSError as e:
+        print(e, file=sys.stderr)
+        return EXIT_FAILED
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,165 +1,319 @@
-import subprocess
-from datetime import datetime
+"""
+Command line interface of CSLapse.
+
+Runs an export without any GUI, using the same export engine as the application.
+Parameters are read from a JSON job file and/or from the arguments,
+arguments take precedence. Progress is printed to stdout as JSON lines.
+
+Example job file:
+    {
+        "exe": "C:/CSLMapView/CSLMapViewer.exe",
+        "sample": "D:/saves/City-2023-01-01.cslmap.gz",
+        "width": 2000,
+        "areas": 3.2,
+        "fps": 12,
+        "threads": 6,
+        "config": "D:/styles/transit-only.xml",
+        "presets": {
+            "day": {},
+            "night": {"./SelectedStyle": "Dark"}
+        },
+        "overlays": [
+            {"kind": "date", "value": "%Y %B", "position": "bottom-left"},
+            {"kind": "text", "value": "My city", "position": "top-left", "size": 0.06},
+            {"kind": "image", "value": "D:/logo.png", "position": "top-right"}
+        ]
+    }
+
+The config is a CSLMapViewConfig.xml file used instead of the one next to the executable.
+Presets render the same saves to one video each, with the given settings
+(by xml path) applied over the config. Overlays are drawn onto the frames,
+their size is relative to the height of the video. Presets and overlays
+can only be given in the job file.
+"""
+
+import sys
+import json
+import argparse
+import logging
+import threading
+import multiprocessing
 from pathlib import Path
-from threading import Lock
-import concurrent.futures
+from shutil import rmtree
+from typing import List, get_type_hints
+
+from modules import constants
+from modules import logs
+from modules import metrics
+from modules.exporter import Exporter, Export_job, Export_listener, Preset, Overlay, AbortException, parse_aspect_ratio, check_presets
+
+# Exit codes
+EXIT_OK = 0
+EXIT_FAILED = 1  # The export was aborted or raised an error
+EXIT_USAGE = 2  # Invalid arguments or job file
+EXIT_INCOMPLETE = 3  # The video was created, but some frames could not be exported
+EXIT_NO_FILES = 4  # No cslmap files found for the city
+EXIT_INTERRUPTED = 130
+
+# JSON types accepted for the field types of the job
+JSON_TYPES = {int: (int,), float: (int, float), str: (str,), bool: (bool,), tuple: (list, tuple)}
+# Fields given in another form in the job than in Export_job
+JOB_FILE_TYPES = {"exe": (str,), "sample": (str,), "config": (str,), "presets": (dict,)}
 
-import cv2
-import easygui
 
-def rmtree(root):
-    for p in root.iterdir():
-        if p.is_dir():
-            rmtree(p)
+class Json_listener(Export_listener):
+    """Export_listener printing the progress as JSON lines to stdout."""
+
+    def __init__(self, stream=sys.stdout):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.estimates = {}  # Latest throughput and time left by stage
+
+    def print(self, **record) -> None:
+        """Print one record as a JSON line."""
+        with self.lock:
+            self.stream.write(json.dumps(record) + "\n")
+            self.stream.flush()
+
+    def event(self, name: str, *args) -> None:
+        if name == "progress_video":
+            self.print(event=name, out_files=args[0])
         else:
-            p.unlink()
-    root.rmdir()
-
-#prepare temporary directory
-def createTempDir(location,time):
-    tempFolder=Path(location,"temp"+time)
-    if tempFolder.exists():
-        rmtree(tempFolder)
-    tempFolder.mkdir()
-    return tempFolder
-
-#Make an array of files whose name matches the city's name
-def collectRawFiles(infolder,cityName):
-    return sorted(
-        filter(
-            lambda filename: filename.name.startswith(cityName) and ".cslmap" in filename.suffixes, 
-            infolder.iterdir()
-        ))
-
-#Run on separate threads: call CSLMapView to export one image file
-def threaded(lock,srcFile,shared):
-    #Prepare command that calls cslmapview.exe
-    newFileName=Path(shared["tempFolder"],srcFile.stem.encode("ascii", "ignore").decode()).with_suffix(".png")
-    cmd=shared["cmd"]
-    cmd[1]=str(srcFile)
-    cmd[3]=str(newFileName)
-
-    #call CSLMapview.exe to export the image. Try at most 15 times, abort after.
-    for _ in range(15):
-        #Ensure that the image file was successfully created. 
+            self.print(event=name)
+
+    def estimate(self, stage: str, per_minute: float, seconds_left: float) -> None:
+        self.estimates[stage] = {"per_minute": round(per_minute, 2), "seconds_left": round(seconds_left)}
+
+    def progress(self, stage: str, done: int, total: int) -> None:
+        self.print(event="progress", stage=stage, done=done, total=total,
+                   **self.estimates.get(stage, {}))
+
+    def ask_retry(self, message: str) -> bool:
+        """Never retry, there is nobody to ask. Failed frames are skipped."""
+        self.print(event="error", message=message)
+        return False
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """Return the parsed command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog="cslapse-cmd",
+        description="Create a timelapse from CSLMapView saves without the GUI.")
+    parser.add_argument("--job", type=Path,
+                        help="JSON file with the parameters of the export")
+    parser.add_argument("--exe", help="path to CSLMapViewer.exe")
+    parser.add_argument("--sample", help="a cslmap file of the city")
+    parser.add_argument("--out", dest="out_file",
+                        help="path of the video file")
+    parser.add_argument("--width", type=int, help="width of the video in pixels")
+    parser.add_argument("--areas", type=float,
+                        help="number of ingame tiles shown (0.1 - 9.0)")
+    parser.add_argument("--length", type=int,
+                        help="number of frames, 0 for all files")
+    parser.add_argument("--fps", type=int, help="frames per second")
+    parser.add_argument("--threads", type=int,
+                        help="number of CSLMapView processes running at the same time")
+    parser.add_argument("--retry", type=int,
+                        help="number of attempts to export one image")
+    parser.add_argument("--timing", choices=["saves", "game_time"],
+                        help="one frame per save, or a constant in-game pace")
+    parser.add_argument("--frame-interval", dest="frame_interval", type=float,
+                        help="in-game seconds between frames with game_time timing")
+    parser.add_argument("--speed-ramp", dest="speed_ramp", type=float,
+                        help="change (0-255) a frame needs to be shown, speeds up quiet periods")
+    parser.add_argument("--interpolate", type=int,
+                        help="video frames for each image, the ones in between are blended")
+    parser.add_argument("--motion-blend", dest="motion_blend", action="store_true", default=None,
+                        help="follow the optical flow when blending")
+    parser.add_argument("--rotation", type=int, choices=[0, 90, 180, 270],
+                        help="clockwise rotation of the video in degrees")
+    parser.add_argument("--aspect-ratio", dest="aspect_ratio",
+                        help="width:height of the video, for example 16:9")
+    parser.add_argument("--offset", type=float,
+                        help="position of the crop from -1 (left or top) to 1 (right or bottom)")
+    parser.add_argument("--ladder", type=lambda text: tuple([int(width) for width in text.split(",")]),
+                        help="comma separated widths of smaller videos made from the same images")
+    parser.add_argument("--draft", type=int, nargs="?", const=constants.DRAFT_FRAMES,
+                        help=f"make a draft of this many evenly spaced saves (default {constants.DRAFT_FRAMES}), "
+                        "its images are reused by later exports with the same settings")
+    parser.add_argument("--progressive", action="store_true", default=None,
+                        help="render the saves in bisection order and keep a video of the rendered ones up to date")
+    parser.add_argument("--config",
+                        help="CSLMapViewConfig.xml to use instead of the one next to the executable")
+    parser.add_argument("--metrics-port", type=int,
+                        help=f"serve Prometheus metrics at http://{constants.METRICS_HOST}:PORT/metrics while exporting")
+    parser.add_argument("--verbose", action="store_true",
+                        help="also print the log to stderr")
+    return parser.parse_args(argv)
+
+
+def check_types(params: dict, fields: type, file_types: dict = None) -> None:
+    """Raise ValueError if a value of params is not of the type of its field in the NamedTuple fields.
+
+    file_types overrides the accepted types of some fields. None is accepted where it is the default.
+    """
+    hints = get_type_hints(fields)
+    for key, value in params.items():
+        if value is None and fields._field_defaults.get(key, 0) is None:
+            continue
+        types = (file_types or {}).get(key, JSON_TYPES.get(hints.get(key), ()))
+        # bool is a subclass of int, but true is not a number
+        if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+            raise ValueError(f"Invalid type of {key}: {type(value).__name__}")
+
+
+def load_job(args: argparse.Namespace) -> dict:
+    """Return the job parameters from the job file updated with the arguments.
+
+    Raise ValueError if the parameters are invalid.
+    """
+    params = {}
+    if args.job is not None:
+        with open(args.job, encoding="utf-8") as f:
+            params = json.load(f)
+        if not isinstance(params, dict):
+            raise ValueError("The job file must contain a JSON object.")
+    for key, value in vars(args).items():
+        if key not in ["job", "verbose", "metrics_port"] and value is not None:
+            params[key] = value
+
+    unknown = set(params) - {"exe", "sample", *Export_job._fields}
+    if unknown:
+        raise ValueError(f"Unknown job parameters: {', '.join(sorted(unknown))}")
+    for key in ["exe", "sample"]:
+        if key not in params:
+            raise ValueError(f"Missing job parameter: {key}")
+    check_types(params, Export_job, JOB_FILE_TYPES)
+    for key in ["width", "fps", "threads", "retry", "interpolate"]:
+        if key in params and not params[key] > 0:
+            raise ValueError(f"Invalid value for {key}: {params[key]}")
+    if "areas" in params and not 0.1 <= params["areas"] <= 9.0:
+        raise ValueError(f"Invalid value for areas: {params['areas']}")
+    if "draft" in params and params["draft"] < 0:
+        raise ValueError(f"Invalid value for draft: {params['draft']}")
+    if "length" in params and params["length"] < 0:
+        raise ValueError(f"Invalid value for length: {params['length']}")
+    if "timing" in params and params["timing"] not in ["saves", "game_time"]:
+        raise ValueError(f"Invalid value for timing: {params['timing']}")
+    if "frame_interval" in params and not params["frame_interval"] > 0:
+        raise ValueError(
+            f"Invalid value for frame_interval: {params['frame_interval']}")
+    if "rotation" in params and params["rotation"] not in [0, 90, 180, 270]:
+        raise ValueError(f"Invalid value for rotation: {params['rotation']}")
+    if "aspect_ratio" in params:
+        parse_aspect_ratio(params["aspect_ratio"])
+    if "offset" in params and not -1 <= params["offset"] <= 1:
+        raise ValueError(f"Invalid value for offset: {params['offset']}")
+    if "ladder" in params:
+        params["ladder"] = tuple(params["ladder"])
+        for width in params["ladder"]:
+            if not (isinstance(width, int) and 0 < width < params.get("width", constants.DEFAULT_EXPORT_WIDTH)):
+                raise ValueError(f"Invalid width in ladder: {width}")
+    if "speed_ramp" in params and params["speed_ramp"] < 0:
+        raise ValueError(f"Invalid value for speed_ramp: {params['speed_ramp']}")
+    if "presets" in params:
+        presets = params["presets"]
+        if not isinstance(presets, dict) or not all(isinstance(settings, dict) for settings in presets.values()):
+            raise ValueError("Presets must be an object of setting objects by name.")
+        params["presets"] = tuple([Preset(name, settings)
+                                  for name, settings in presets.items()])
+        check_presets(params["presets"])
+    if "overlays" in params:
         try:
-            subprocess.run(cmd,shell=False,stderr=subprocess.DEVNULL,stdout=subprocess.DEVNULL,check=True)
-
-            #Make sure the new file was created successfully
-            assert newFileName.exists()
-            
-            #record that a new image was created and continue to the next one
-            with lock:
-                shared["imageFiles"].append(str(newFileName))
-
-                #Display status
-                ratio=50*len(shared["imageFiles"])//shared["limit"]
-                print(f"\r |{'#'*ratio}{'-'*(50-ratio)}| {len(shared['imageFiles'])} of {shared['limit']} ",end="")
-            return
-        except subprocess.CalledProcessError(returncode, cmd):
-            pass
-        except AssertionError():
-            pass
-
-#Export all image files (or all up to the set limit)
-def createImages(rawFiles,settings):
-    #set amount of files to be processed
-    limit = len(rawFiles) if settings["limit"]==0 else min(len(rawFiles),settings["limit"])
-
-    #Prepare shared resources for threading
-    shared={
-        "limit":limit,
-        "tempFolder":settings["tempFolder"],
-        "cmd":[settings["executable"],"","-output","","-silent","-imagewidth",str(settings["imageWidth"]),"-area",str(settings["area"])],
-        "imageFiles":[]
-    }
+            overlays = tuple([Overlay(**overlay) for overlay in params["overlays"]])
+        except TypeError as e:
+            raise ValueError(f"Invalid overlay: {e}")
+        for overlay in overlays:
+            check_types(overlay._asdict(), Overlay)
+        for overlay in overlays:
+            if overlay.kind not in constants.OVERLAY_KINDS:
+                raise ValueError(f"Invalid overlay kind: {overlay.kind}")
+            if overlay.position not in constants.OVERLAY_POSITIONS:
+                raise ValueError(f"Invalid overlay position: {overlay.position}")
+            if overlay.kind in ["text", "image"] and not overlay.value:
+                raise ValueError(f"Missing value of {overlay.kind} overlay")
+            if not 0 < overlay.size <= 1:
+                raise ValueError(f"Invalid overlay size: {overlay.size}")
+        params["overlays"] = overlays
+    return params
 
-    #Run CSLMapView on several threads parallel
-    print(f" |{'-'*50}| 0 of {limit} ",end="")
-    l=Lock()
-    with concurrent.futures.ThreadPoolExecutor(settings["threads"]) as executor:
-        for i in range(limit):
-            #start exporting on a new thread
-            executor.submit(threaded,l,rawFiles[i],shared)
-    print("Done")
-
-    #Return a sorted array as the order might have changed during threading
-    return sorted(shared["imageFiles"])
-
-#Combine image files into a video file. Potentially very huge filesize.
-def renderVideo(images,outFile,settings):
-    #create video file
-    out = cv2.VideoWriter(outFile,cv2.VideoWriter_fourcc(*"mp4v"), settings["fps"], (settings["imageWidth"],settings["imageWidth"]))
-    i=0
-    for file in images:
-        #Display status
-        ratio=50*i//len(images)
-        print(f"\r |{'#'*ratio}{'-'*(50-ratio)}| {i} of {len(images)} ",end="")
-
-        #add frame to video
-        img = cv2.imread(file)
-        out.write(img)
-
-        i+=1
-    print(f"\r |{'#'*50}| {i} of {len(images)} Done")
-    out.release()
-
-#Delete temporary folder and files
-def cleanup(folder):
-    rmtree(folder)
-
-
-def main():
-    #timestamp to have a unique name
-    time=str(datetime.now()).split(" ")[-1].split(".")[0].replace(":","")
-
-    #Settings for processing and the video
-    #Currently only supports 1:1 aspect ratio
-    settings={
-        "fps":12,               #fps: 12 with 5 min autosave yields 3600x speed
-        "area":3.2,             #Ingame tiles on the video, centered at the center of the map
-        "limit":0,              #Limit the frames in the video, ideal for test runs to see how it will look. Keep at 0 to ignore
-        "imageWidth":2000,      #Image (and video) dimensions in pixels
-        "threads":6,            #Number of threads to use - more threads put a heavier load on cpu and not necessarily increase speed
-        "executable":"",        #CSLMapView.exe
-        "tempFolder":""         #Folder where temporary image files will be stored, it's deleted before the program exits
-    }
 
-    #Locate cslmapviewer.exe
-    settings["executable"]=easygui.fileopenbox(title="Select file",msg="Select CSLmapview.exe",filetypes=["*.exe"])
+def main(argv: List[str] = None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    log_listener = logs.start(console=args.verbose)
+    try:
+        return run(args)
+    finally:
+        log_listener.stop()
 
-    #locate the source files
-    sampleFile=Path(easygui.fileopenbox(
-        title="Open file",msg="Choose a cslmap file of your city",
-        filetypes=[["*.cslmap.gz", "*.cslmap", "CSLmap files"]]
-        ))
-    sourceDir=sampleFile.parent
-    cityName=sampleFile.stem.split("-")[0]
 
-    #prepare temporary directory
-    settings["tempFolder"]=createTempDir(sourceDir, time)
+def run(args: argparse.Namespace) -> int:
+    """Run the export described by the parsed command line args and return the exit code."""
+    listener = Json_listener()
 
     try:
-        #collect files to be used in a list
-        rawFiles=collectRawFiles(sourceDir,cityName)
+        params = load_job(args)
+    except (OSError, ValueError) as e:
+        listener.print(event="failed", message=str(e))
+        return EXIT_USAGE
 
-        #export images from source files
-        print("\nCreating images...")
-        imgFiles=createImages(rawFiles,settings)
+    exe = params.pop("exe")
+    sample = params.pop("sample")
+    try:
+        if params.get("config") is not None:
+            params["config"] = Path(params["config"]).read_bytes()
+    except OSError as e:
+        listener.print(event="failed", message=str(e))
+        return EXIT_USAGE
+    job = Export_job(**params)
 
-        #Join the images into a video and save it to the source directory
-        print("\nRendering video from images...")
-        outFile=str(Path(sourceDir,f'{cityName.encode("ascii", "ignore").decode()}-{time}.mp4'))
-        renderVideo(imgFiles, outFile,settings)
+    exporter = Exporter()
+    exporter.subscribe(listener)
+    server = None
+    try:
+        if args.metrics_port is not None:
+            server = metrics.serve(exporter.metrics, args.metrics_port)
+            host, port = server.server_address[:2]
+            listener.print(event="metrics", url=f"http://{host}:{port}/metrics")
+        exporter.set_exefile(exe)
+        exporter.set_sample_file(sample)
+        found = exporter.collect_raw_files(sample)
+        listener.print(event="files_collected", files=found)
+        if found == 0:
+            listener.print(event="failed", message="No cslmap files found.")
+            return EXIT_NO_FILES
 
-        print("\nSee your timelapse at",outFile)
+        job = exporter.prepare(job)
+        exporter.run(job)
+        exported = exporter.get_num_of_exported_files()
+        summary = exporter.get_summary()
+        listener.print(event="finished", out_files=exporter.get_out_files(),
+                       frames=exported, failed=exporter.total - exported,
+                       duplicates=summary["duplicates"], cached=summary["cached"],
+                       frames_per_minute=summary["frames_per_minute"], bottleneck=summary["bottleneck"],
+                       report=summary["report"],
+                       saved_render_hours=summary["saved_render_hours"])
+        return EXIT_OK if exported == exporter.total else EXIT_INCOMPLETE
+    except KeyboardInterrupt:
+        exporter.set_abort()
+        listener.print(event="failed", message="Interrupted.")
+        return EXIT_INTERRUPTED
+    except AbortException as e:
+        listener.print(event="failed", message="Export aborted.")
+        return EXIT_FAILED
     except Exception as e:
-        print(e)
+        logging.getLogger("root").exception("Export failed.")
+        listener.print(event="failed", message=str(e))
+        return EXIT_FAILED
     finally:
-        #Clean up image files and temporary folder
-        print("\nCleaning up temporary files...",end="")
-        cleanup(settings["tempFolder"])
-        print("Done")
+        if server is not None:
+            server.shutdown()
+        exporter.renderer.shutdown()
+        if exporter.temp_folder is not None and exporter.temp_folder.exists():
+            rmtree(exporter.temp_folder, ignore_errors=True)
+
 
-if __name__=='__main__':
-    main()
\ No newline at end of file
+if __name__ == '__main__':
+    # Metadata of the saves is read in a process pool, needed for PyInstaller
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -9,6 +9,7 @@ DEFAULT_RETRY = 5
 DEFAULT_AREAS = 9.0
 NO_FILE_TEXT = "No file selected"
 ROTA_OPTIONS = ["0°", "90°", "180°", "270°"]
+ASPECT_OPTIONS = ["1:1", "4:3", "16:9", "21:9", "9:16"]
 
 
 class texts:
@@ -21,6 +22,7 @@ class texts:
     INVALID_THREADS_MESSAGE = "Invalid value for threads!"
     INVALUD_RETRY_MESSAGE = "Invalid value for retry!"
     INVALID_LENGTH_MESSAGE = "Invalid value for video length!"
+    INVALID_INTERPOLATE_MESSAGE = "Invalid value for interpolation!"
     ASK_SAVE_SETTINGS_TITLE = "Apply settings?"
     ASK_SAVE_SETTINGS_MESSAGE = "You have made unsaved changes to the settings. Do you want to save them?"
     ASK_ABORT_MESSAGE = "Are you sure you want to abort? This cannot be undone, all progress will be lost."
@@ -49,3 +51,60 @@ SETTINGS_FILE_NAME = "CSLMapViewConfig.xml"
 
 # settings.py
 LAYOUT_SOURCE = "layout.xml"
+
+# exporter.py
+TEMP_FOLDER_PREFIX = "temp-"
+PREVIEW_FOLDER_NAME = ".preview"  # Folder of the previews in the temp folder, unlike names of presets
+MAX_TIMED_FRAMES = 100000  # Limit of frames generated from the in-game time of saves
+LADDER_QUEUE_SIZE = 8  # Frames waiting to be downscaled for one size of a resolution ladder
+DRAFT_FRAMES = 60  # Number of saves rendered for a draft video
+FRAME_CACHE_FOLDER = "~/.cslapse/frames"  # Where the images rendered for drafts are kept for later exports
+REPORT_FOLDER = "~/.cslapse/reports"  # Where the timings of the exports are written
+THROUGHPUT_WINDOW = 60  # Seconds of progress the throughput and the estimated time left are averaged over
+
+# runtime.py
+RUNTIME_SUFFIXES = [".dll", ".config", ".xml", ".json"]  # Files next to CSLMapView mirrored for export jobs
+
+# logs.py
+LOG_FOLDER = "~/.cslapse/logs"  # Where the log files of the runs are written
+LOG_FILE_MAX_BYTES = 10_000_000  # Size of the log file of a run before it is rotated
+LOG_FILE_BACKUPS = 2  # Rotated log files kept of a run
+LOG_RETENTION_BYTES = 100_000_000  # Size of all log files, the oldest ones are deleted above it
+
+# metrics.py
+METRICS_HOST = "127.0.0.1"  # Only local clients may read the metrics
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)  # Upper bounds in seconds
+
+# scanner.py
+INDEX_FOLDER = "~/.cslapse/index"  # Where the indexes of the save directories are stored
+SCAN_PROGRESS_STEP = 256  # Number of examined files between progress reports
+
+# cslmap.py
+METADATA_TAGS = {  # Possible names of the elements holding the metadata, by key
+    "city": ["CityName", "cityName"],
+    "game_time": ["GameTime", "gameTime", "SimulationDateTime", "DateTime", "Date"],
+    "population": ["Population", "population"]
+}
+METADATA_TIME_FORMATS = [None, "%Y/%m/%d %H:%M:%S", "%Y/%m/%d",
+                         "%m/%d/%Y %H:%M:%S"]  # None is ISO format
+METADATA_MAX_DEPTH = 3  # The root element is at depth 1
+METADATA_ELEMENT_LIMIT = 500  # Elements parsed before giving up
+METADATA_POOL_THRESHOLD = 16  # Fewer files are read without a process pool
+HASH_CHUNK_SIZE = 1 << 20  # Bytes hashed at once
+
+# frames.py
+ANALYSIS_WIDTH = 128  # Width of the thumbnails frames are compared by
+MAX_RAMP_STRIDE = 8  # Quiet periods are sped up at most this many times
+DEFAULT_SPEED_RAMP = 1.5  # Change threshold used when speeding up quiet periods in the GUI
+OVERLAY_KINDS = ["date", "population", "text", "image"]
+OVERLAY_POSITIONS = ["top-left", "top-right", "bottom-left", "bottom-right"]
+OVERLAY_MARGIN = 0.02  # Distance of the overlays from the edges relative to the width of the video
+DEFAULT_OVERLAY_SIZE = 0.04  # Height of the overlays relative to the height of the video
+DEFAULT_DATE_FORMAT = "%Y-%m-%d"
+SPRITE_CACHE_SIZE = 256  # Number of rasterised overlays kept
+
+# messages.py
+PROGRESS_REFRESH_RATE = 10  # Times per second progress is shown in the gui
+
+# CSLapse.py
+ASK_RETRY_POLL_INTERVAL = 0.5  # Seconds between checks for an abort while a worker waits for the user to answer
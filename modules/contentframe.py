@@ -92,7 +92,8 @@ class Main_frame(Content_frame):
                                     "readonly"], textvariable=vars["sample_file"], cursor=constants.CLICKABLE)
         self.sampleSelectBtn = ttk.Button(
             self.fileSelectionBox, text="Select file", cursor=constants.CLICKABLE, command=callbacks["select_sample"])
-        self.filesLoading = ttk.Progressbar(self.fileSelectionBox)
+        self.filesLoading = ttk.Progressbar(
+            self.fileSelectionBox, orient="horizontal", mode="determinate", maximum=100, variable=vars["scanning_done"])
         self.filesNumLabel = ttk.Label(
             self.fileSelectionBox, textvariable=vars["num_of_files"])
         self.filesLoadedLabel = ttk.Label(
@@ -113,6 +114,25 @@ class Main_frame(Content_frame):
         self.lengthInput = ttk.Entry(
             self.videoSettingsBox, width=7, textvariable=vars["video_length"])
         self.lengthUnit = ttk.Label(self.videoSettingsBox, text="frames")
+        self.timingCheck = ttk.Checkbutton(
+            self.videoSettingsBox, text="Steady in-game pace", variable=vars["steady_pace"], cursor=constants.CLICKABLE)
+        self.rampCheck = ttk.Checkbutton(
+            self.videoSettingsBox, text="Speed up quiet periods", variable=vars["speed_ramp"], cursor=constants.CLICKABLE)
+        self.interpolateLabel = ttk.Label(
+            self.videoSettingsBox, text="Smoothing:")
+        self.interpolateEntry = ttk.Spinbox(
+            self.videoSettingsBox, width=5, textvariable=vars["interpolate"], from_=1, to=10, increment=1, wrap=False)
+        self.interpolateUnit = ttk.Label(
+            self.videoSettingsBox, text="frames per image")
+        self.titleLabel = ttk.Label(self.videoSettingsBox, text="Title:")
+        self.titleEntry = ttk.Entry(
+            self.videoSettingsBox, width=20, textvariable=vars["title"])
+        self.dateCheck = ttk.Checkbutton(
+            self.videoSettingsBox, text="Show in-game date", variable=vars["show_date"], cursor=constants.CLICKABLE)
+        self.draftCheck = ttk.Checkbutton(
+            self.videoSettingsBox, text="Draft (a few saves only)", variable=vars["draft"], cursor=constants.CLICKABLE)
+        self.progressiveCheck = ttk.Checkbutton(
+            self.videoSettingsBox, text="Coarse to fine order", variable=vars["progressive"], cursor=constants.CLICKABLE)
 
         self.advancedSettingBox = ttk.Labelframe(self.frame, text="Advanced")
         self.threadsLabel = ttk.Label(self.advancedSettingBox, text="Threads:")
@@ -129,8 +149,9 @@ class Main_frame(Content_frame):
         self.exportingDoneLabel = ttk.Label(
             self.progressFrame, textvariable=vars["exporting_done"])
         self.exportingOfLabel = ttk.Label(self.progressFrame, text=" of ")
-        self.exportingTotalLabel = ttk.Label(
-            self.progressFrame, textvariable=vars["video_length"])
+        self.exportingTotalLabel = ttk.Label(self.progressFrame)
+        self.exportingEtaLabel = ttk.Label(
+            self.progressFrame, textvariable=vars["exporting_eta"])
         self.exportingProgress = ttk.Progressbar(
             self.progressFrame, orient="horizontal", mode="determinate", variable=vars["exporting_done"])
         self.renderingLabel = ttk.Label(
@@ -139,8 +160,12 @@ class Main_frame(Content_frame):
             self.progressFrame, textvariable=vars["rendering_done"])
         self.renderingOfLabel = ttk.Label(self.progressFrame, text=" of ")
         self.renderingTotalLabel = ttk.Label(self.progressFrame)
+        self.renderingEtaLabel = ttk.Label(
+            self.progressFrame, textvariable=vars["rendering_eta"])
         self.renderingProgress = ttk.Progressbar(
             self.progressFrame, orient="horizontal", mode="determinate", variable=vars["rendering_done"])
+        self.progressVideoLabel = ttk.Label(
+            self.progressFrame, textvariable=vars["progress_video"])
 
         self.submitBtn = ttk.Button(
             self.frame, text="Export", cursor=constants.CLICKABLE, command=callbacks["submit"])
@@ -163,6 +188,7 @@ class Main_frame(Content_frame):
         self.sampleSelectBtn.grid(column=2, row=3)
         self.filesNumLabel.grid(column=0, row=4, sticky=tkinter.W)
         self.filesLoadedLabel.grid(column=1, row=4, sticky=tkinter.W)
+        self.filesLoading.grid(column=0, row=5, columnspan=3, sticky=tkinter.EW)
 
         self.videoSettingsBox.grid(
             column=0, row=1, sticky=tkinter.EW, padx=2, pady=10)
@@ -174,6 +200,16 @@ class Main_frame(Content_frame):
         self.lengthLabel.grid(column=0, row=2, sticky=tkinter.W)
         self.lengthInput.grid(column=1, row=2, sticky=tkinter.W)
         self.lengthUnit.grid(column=2, row=2, sticky=tkinter.W)
+        self.timingCheck.grid(column=0, row=3, columnspan=3, sticky=tkinter.W)
+        self.rampCheck.grid(column=0, row=4, columnspan=3, sticky=tkinter.W)
+        self.interpolateLabel.grid(column=0, row=5, sticky=tkinter.W)
+        self.interpolateEntry.grid(column=1, row=5, sticky=tkinter.W)
+        self.interpolateUnit.grid(column=2, row=5, sticky=tkinter.W)
+        self.titleLabel.grid(column=0, row=6, sticky=tkinter.W)
+        self.titleEntry.grid(column=1, row=6, columnspan=2, sticky=tkinter.EW)
+        self.dateCheck.grid(column=0, row=7, columnspan=3, sticky=tkinter.W)
+        self.draftCheck.grid(column=0, row=8, columnspan=3, sticky=tkinter.W)
+        self.progressiveCheck.grid(column=0, row=9, columnspan=3, sticky=tkinter.W)
 
         self.advancedSettingBox.grid(
             column=0, row=2, sticky=tkinter.EW, padx=2, pady=5)
@@ -187,6 +223,7 @@ class Main_frame(Content_frame):
         self.exportingDoneLabel.grid(column=1, row=0)
         self.exportingOfLabel.grid(column=2, row=0)
         self.exportingTotalLabel.grid(column=3, row=0)
+        self.exportingEtaLabel.grid(column=4, row=0, sticky=tkinter.E)
         self.exportingProgress.grid(
             column=0, row=1, columnspan=5, sticky=tkinter.EW)
 
@@ -194,8 +231,11 @@ class Main_frame(Content_frame):
         self.renderingDoneLabel.grid(column=1, row=2)
         self.renderingOfLabel.grid(column=2, row=2)
         self.renderingTotalLabel.grid(column=3, row=2)
+        self.renderingEtaLabel.grid(column=4, row=2, sticky=tkinter.E)
         self.renderingProgress.grid(
             column=0, row=3, columnspan=5, sticky=tkinter.EW)
+        self.progressVideoLabel.grid(
+            column=0, row=4, columnspan=5, sticky=tkinter.W)
 
         self.submitBtn.grid(column=0, row=10, sticky=(
             tkinter.S, tkinter.E, tkinter.W))
@@ -229,6 +269,13 @@ class Main_frame(Content_frame):
                 self.fpsEntry,
                 self.imageWidthInput,
                 self.lengthInput,
+                self.timingCheck,
+                self.rampCheck,
+                self.interpolateEntry,
+                self.dateCheck,
+                self.draftCheck,
+                self.progressiveCheck,
+                self.titleEntry,
                 self.threadsEntry,
                 self.retryEntry,
             )
@@ -248,8 +295,11 @@ class Main_frame(Content_frame):
                 self.exportingDoneLabel,
                 self.exportingOfLabel,
                 self.exportingTotalLabel,
-                self.abortBtn
+                self.abortBtn,
+                self.filesLoading
             )
+        elif state == "files_deduplicated":
+            self._hide_widgets(self.filesLoading)
         elif state == "start_render":
             self._disable_widgets(
                 self.exeSelectBtn,
@@ -257,6 +307,13 @@ class Main_frame(Content_frame):
                 self.fpsEntry,
                 self.imageWidthInput,
                 self.lengthInput,
+                self.timingCheck,
+                self.rampCheck,
+                self.interpolateEntry,
+                self.dateCheck,
+                self.draftCheck,
+                self.progressiveCheck,
+                self.titleEntry,
                 self.threadsEntry,
                 self.retryEntry,
             )
@@ -285,6 +342,13 @@ class Main_frame(Content_frame):
                 self.fpsEntry,
                 self.imageWidthInput,
                 self.lengthInput,
+                self.timingCheck,
+                self.rampCheck,
+                self.interpolateEntry,
+                self.dateCheck,
+                self.draftCheck,
+                self.progressiveCheck,
+                self.titleEntry,
                 self.threadsEntry,
                 self.retryEntry,
             )
@@ -305,14 +369,28 @@ class Main_frame(Content_frame):
                 self.fpsEntry,
                 self.imageWidthInput,
                 self.lengthInput,
+                self.timingCheck,
+                self.rampCheck,
+                self.interpolateEntry,
+                self.dateCheck,
+                self.draftCheck,
+                self.progressiveCheck,
+                self.titleEntry,
                 self.threadsEntry,
                 self.retryEntry,
             )
             self._hide_widgets(
                 self.progressFrame,
                 self.abortBtn,
+                self.filesLoading,
             )
             self._show_widgets(self.submitBtn)
+        elif state == "scanning":
+            self._disable_widgets(self.sampleSelectBtn, self.submitBtn)
+            self._show_widgets(self.filesLoading)
+        elif state == "scanning_done":
+            self._enable_widgets(self.sampleSelectBtn, self.submitBtn)
+            self._hide_widgets(self.filesLoading)
         elif state == "aborting":
             self._disable_widgets(
                 self.exeSelectBtn,
@@ -320,6 +398,13 @@ class Main_frame(Content_frame):
                 self.fpsEntry,
                 self.imageWidthInput,
                 self.lengthInput,
+                self.timingCheck,
+                self.rampCheck,
+                self.interpolateEntry,
+                self.dateCheck,
+                self.draftCheck,
+                self.progressiveCheck,
+                self.titleEntry,
                 self.threadsEntry,
                 self.retryEntry,
                 self.abortBtn,
@@ -333,6 +418,13 @@ class Main_frame(Content_frame):
                 self.fpsEntry,
                 self.imageWidthInput,
                 self.lengthInput,
+                self.timingCheck,
+                self.rampCheck,
+                self.interpolateEntry,
+                self.dateCheck,
+                self.draftCheck,
+                self.progressiveCheck,
+                self.titleEntry,
                 self.threadsEntry,
                 self.retryEntry,
                 self.abortBtn,
@@ -346,6 +438,7 @@ class Main_frame(Content_frame):
     def set_export_limit(self, limit: int) -> None:
         """Set the size of the progress bar for exported images."""
         self.exportingProgress.config(maximum=limit)
+        self.exportingTotalLabel.configure(text=limit)
 
     def set_video_limit(self, limit: int) -> None:
         """Set the size of the progressbar for video frames."""
@@ -386,6 +479,21 @@ class Preview_frame(Content_frame):
             self.rotationSelection.menu.add_radiobutton(
                 label=option, variable=vars["rotation"])
 
+        self.aspectLabel = ttk.Label(
+            self.canvasSettingFrame, text="Aspect ratio:")
+        self.aspectSelection = ttk.Menubutton(
+            self.canvasSettingFrame, textvariable=vars["aspect_ratio"], cursor=constants.CLICKABLE)
+        self.aspectSelection.menu = tkinter.Menu(
+            self.aspectSelection, tearoff=0)
+        self.aspectSelection["menu"] = self.aspectSelection.menu
+        for option in constants.ASPECT_OPTIONS:
+            self.aspectSelection.menu.add_radiobutton(
+                label=option, variable=vars["aspect_ratio"])
+        self.offsetLabel = ttk.Label(
+            self.canvasSettingFrame, text="Framing:")
+        self.offsetSlider = ttk.Scale(self.canvasSettingFrame, orient=tkinter.HORIZONTAL, from_=-1.0, to=1.0,
+                                      variable=vars["offset"], cursor=constants.CLICKABLE)
+
     def _grid(self) -> None:
         """Grid the widgets contained in the preview frame."""
         self.frame.grid(column=20, row=0, rowspan=2, sticky=tkinter.NSEW)
@@ -401,9 +509,14 @@ class Preview_frame(Content_frame):
         self.zoomEntry.grid(column=1, row=0, sticky=tkinter.W)
         self.zoomSlider.grid(column=2, row=0, sticky=tkinter.EW)
 
-        # Functionality not implemented yet
-        # self.rotationLabel.grid(column = 0, row = 1, columnspan = 3, sticky = tkinter.W)
-        # self.rotationSelection.grid(column = 1, row = 1, columnspan = 2, sticky = tkinter.W)
+        self.rotationLabel.grid(column=0, row=1, sticky=tkinter.W)
+        self.rotationSelection.grid(
+            column=1, row=1, columnspan=2, sticky=tkinter.W)
+        self.aspectLabel.grid(column=0, row=2, sticky=tkinter.W)
+        self.aspectSelection.grid(
+            column=1, row=2, columnspan=2, sticky=tkinter.W)
+        self.offsetLabel.grid(column=0, row=3, sticky=tkinter.W)
+        self.offsetSlider.grid(column=1, row=3, columnspan=2, sticky=tkinter.EW)
 
     def _create_bindings(self, callbacks: dict) -> None:
         """Bind events to widgets in the preview frame."""
@@ -425,17 +538,26 @@ class Preview_frame(Content_frame):
         if state == "start_export":
             self._disable_widgets(
                 self.zoomSlider,
-                self.zoomEntry
+                self.zoomEntry,
+                self.rotationSelection,
+                self.aspectSelection,
+                self.offsetSlider
             )
         elif state == "start_render":
             self._disable_widgets(
                 self.zoomSlider,
-                self.zoomEntry
+                self.zoomEntry,
+                self.rotationSelection,
+                self.aspectSelection,
+                self.offsetSlider
             )
         elif state == "render_done":
             self._enable_widgets(
                 self.zoomSlider,
-                self.zoomEntry
+                self.zoomEntry,
+                self.rotationSelection,
+                self.aspectSelection,
+                self.offsetSlider
             )
         elif state == "default_state":
             self._disable_widgets(
@@ -445,7 +567,9 @@ class Preview_frame(Content_frame):
             self._enable_widgets(
                 self.zoomSlider,
                 self.zoomEntry,
-                self.rotationSelection
+                self.rotationSelection,
+                self.aspectSelection,
+                self.offsetSlider
             )
             self._hide_widgets(
                 self.refreshPreviewBtn,
@@ -481,6 +605,9 @@ class Preview_frame(Content_frame):
             self._disable_widgets(
                 self.zoomSlider,
                 self.zoomEntry,
+                self.rotationSelection,
+                self.aspectSelection,
+                self.offsetSlider,
                 self.fitToCanvasBtn,
                 self.originalSizeBtn,
                 self.refreshPreviewBtn
@@ -489,6 +616,9 @@ class Preview_frame(Content_frame):
             self._enable_widgets(
                 self.zoomSlider,
                 self.zoomEntry,
+                self.rotationSelection,
+                self.aspectSelection,
+                self.offsetSlider,
                 self.fitToCanvasBtn,
                 self.originalSizeBtn,
                 self.refreshPreviewBtn
@@ -550,10 +680,27 @@ class Pages_frame(Content_frame):
 
 
 class Settings_page(Content_frame):
+    """A page of CSLMapView settings.
+
+    The widgets are only created when the page is first opened.
+    They are created once, the settings handler sets their variables
+    when another file is loaded.
+    """
 
     def __init__(self, parent: tkinter.Widget, vars: dict, callbacks: dict, page: str) -> None:
-        super().__init__(parent, vars, callbacks)
+        self.parent = parent
+        self.vars = vars
+        self.callbacks = callbacks
         self.page = page
+        self.frame = None  # Created by _build
+        self.visible = False
+        self.xml_state = None  # The last received of "xml_loaded" and "xml_load_error"
+        self.settings_loaded = False  # If the setting widgets have been created
+
+    def _build(self) -> None:
+        """Create the widgets of the page if they do not exist yet."""
+        if self.frame is None:
+            super().__init__(self.parent, self.vars, self.callbacks)
 
     def _populate(self, vars: dict, callbacks: dict) -> None:
         """Create the non-setting widgets contained in the frame."""
@@ -591,21 +738,36 @@ class Settings_page(Content_frame):
     def set_state(self, state: str) -> None:
         """Set options for the widgets in the frame."""
         if state == self.page:
+            self._build()
+            self._show_xml_state()
             self.show()
-        elif state == constants.MAIN_PAGE:
-            self.hide()
-        elif state in settings.layout_loader.get_pages():
-            self.hide()
-        elif state == "xml_loaded":
-            self._load_settings()
+            self.visible = True
+        elif state == constants.MAIN_PAGE or state in settings.layout_loader.get_pages():
+            if self.frame is not None:
+                self.hide()
+            self.visible = False
+        elif state in ["xml_loaded", "xml_load_error"]:
+            self.xml_state = state
+            if self.visible:
+                self._show_xml_state()
+
+    def _show_xml_state(self) -> None:
+        """Show the settings or the error according to the last loaded file, create the setting widgets if needed."""
+        if self.xml_state == "xml_loaded":
+            if not self.settings_loaded:
+                self._load_settings()
+                self.settings_loaded = True
             self._hide_widgets(self.no_file_frame, self.xml_error_frame)
             self._show_widgets(self.settings_frame)
-        elif state == "xml_load_error":
+        elif self.xml_state == "xml_load_error":
             self._hide_widgets(self.no_file_frame, self.settings_frame)
             self._show_widgets(self.xml_error_frame)
 
     def _load_settings(self) -> None:
-        """Delete the setting widgets and create new ones with state set to the value loaded from file."""
+        """Delete the setting widgets and create new ones with state set to the value loaded from file.
+
+        Each variable replaces the one registered for the same path in the settings handler.
+        """
         for child in self.settings_frame.winfo_children():
             child.destroy()
 
@@ -0,0 +1,97 @@
+import gzip
+import zlib
+import hashlib
+import logging
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from pathlib import Path
+from typing import IO
+
+from . import constants
+
+"""
+Module responsible for reading metadata from cslmap files without CSLMapView.
+
+A cslmap file is an xml document, optionally gzip compressed. The metadata,
+like the name of the city and the in-game date, is stored near the start of
+the document, so the file is parsed as a stream and reading stops as soon as
+the metadata is found, long before the bulk of the map data is reached.
+"""
+
+
+def _open(path: Path) -> IO[bytes]:
+    """Open path for reading, decompressing it on the fly if it is gzip compressed."""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def content_hash(path: Path) -> str:
+    """Return a hash of the decompressed contents of the cslmap file at path.
+
+    The file is read in chunks of constants.HASH_CHUNK_SIZE bytes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with _open(path) as f:
+        for chunk in iter(lambda: f.read(constants.HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _tag(element: ET.Element) -> str:
+    """Return the tag of element without its namespace."""
+    return element.tag.rsplit("}", 1)[-1]
+
+
+def _game_time(text: str) -> str:
+    """Return the in-game date text in ISO format, None if it is not a known date format."""
+    text = text.strip()
+    for time_format in constants.METADATA_TIME_FORMATS:
+        try:
+            if time_format is None:
+                return datetime.fromisoformat(text).isoformat()
+            return datetime.strptime(text, time_format).isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def read_metadata(path: Path) -> dict:
+    """Return the metadata found in the header of the cslmap file at path.
+
+    Only elements nested at most constants.METADATA_MAX_DEPTH levels deep and
+    the first constants.METADATA_ELEMENT_LIMIT elements are considered.
+    Keys of the result are those of constants.METADATA_TAGS, missing values are None,
+    game_time is in ISO format. If the file can not be read, the message is stored under "error".
+    """
+    tags = {tag: key for key, candidates in constants.METADATA_TAGS.items()
+            for tag in candidates}
+    metadata = dict.fromkeys(constants.METADATA_TAGS)
+    depth = 0
+    elements = 0
+    try:
+        with _open(path) as f:
+            for event, element in ET.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    elements += 1
+                    if elements > constants.METADATA_ELEMENT_LIMIT:
+                        break
+                    continue
+                key = tags.get(_tag(element))
+                if (key is not None and depth <= constants.METADATA_MAX_DEPTH
+                        and metadata[key] is None and element.text and element.text.strip()):
+                    metadata[key] = element.text.strip()
+                    if None not in metadata.values():
+                        break
+                depth -= 1
+    except (OSError, EOFError, zlib.error, ET.ParseError) as e:
+        # gzip.BadGzipFile is an OSError
+        logging.getLogger("exporter").warning(
+            f"Could not read metadata of '{path}': {e}")
+        metadata["error"] = str(e)
+    if metadata.get("game_time") is not None:
+        metadata["game_time"] = _game_time(metadata["game_time"])
+    return metadata
@@ -0,0 +1,1198 @@
+from __future__ import annotations
+import os
+import subprocess
+import time
+import hashlib
+import queue
+import bisect
+from datetime import datetime, timezone
+from pathlib import Path
+import threading
+import concurrent.futures
+from typing import List, Tuple, Iterator, Callable, NamedTuple, TYPE_CHECKING
+from shutil import rmtree, copy2
+import tempfile
+from functools import wraps
+import logging
+
+from . import constants
+from . import renderqueue
+from . import runtime
+from . import scanner
+from . import frames
+from . import timings
+from . import metrics
+
+if TYPE_CHECKING:
+    # Imported on demand, loading OpenCV is slow and only needed for encoding
+    import cv2
+    import numpy as np
+
+"""
+Module responsible for exporting images with CSLMapView and assembling the video.
+
+The module does not depend on the GUI. The progress of an export
+is reported to the Export_listener objects subscribed to the Exporter,
+so it can be followed from the GUI, a command line or a test alike.
+"""
+
+
+class AbortException(Exception):
+    pass
+
+
+class ExportError(Exception):
+    pass
+
+
+def parse_aspect_ratio(text: str) -> float:
+    """Return the aspect ratio given as "width:height" as a number.
+
+    Raise ValueError if text is not a valid aspect ratio.
+    """
+    width, height = [float(side) for side in str(text).split(":")]
+    if not (width > 0 and height > 0):
+        raise ValueError(f"Invalid aspect ratio: {text}")
+    return width / height
+
+
+def preset_file_name(name: str) -> str:
+    """Return the name of a preset as used in the names of its folder and its videos."""
+    return "".join([c if c.isalnum() or c in "-_" else "_" for c in name])
+
+
+def check_presets(presets: List[Preset]) -> None:
+    """Raise ValueError if two of the presets would write to the same files."""
+    seen = {}
+    for preset in presets:
+        name = preset_file_name(preset.name)
+        if name in seen:
+            raise ValueError(f"Presets '{seen[name]}' and '{preset.name}' have the same file name '{name}'.")
+        seen[name] = preset.name
+
+
+def bisection_levels(n: int) -> List[List[int]]:
+    """Return the positions 0 to n - 1 grouped into levels of bisection.
+
+    The first level is the two endpoints, every further level holds
+    the midpoints of the intervals left by the levels before it.
+    """
+    if n < 3:
+        return [list(range(n))] if n else []
+    levels = [[0, n - 1]]
+    intervals = [(0, n - 1)]
+    while intervals:
+        level, halves = [], []
+        for start, end in intervals:
+            if end - start < 2:
+                continue
+            middle = (start + end) // 2
+            level.append(middle)
+            halves += [(start, middle), (middle, end)]
+        if level:
+            levels.append(level)
+        intervals = halves
+    return levels
+
+
+def timestamp() -> str:
+    """Return a timestamp in format hhmmss."""
+    return str(datetime.now()).split(" ")[-1].split(".")[0].replace(":", "")
+
+
+class Export_job(NamedTuple):
+    """Parameters of one export process."""
+    width: int = constants.DEFAULT_EXPORT_WIDTH  # Width of the images and the video in pixels
+    areas: float = constants.DEFAULT_AREAS  # Number of ingame tiles shown on the images
+    length: int = 0  # Number of frames in the video, 0 means all collected files
+    fps: int = constants.DEFAULT_FPS
+    threads: int = constants.DEFAULT_THREADS  # Number of CSLMapView processes running at the same time
+    retry: int = constants.DEFAULT_RETRY  # Number of attempts to export one image
+    out_file: str = None  # Path of the video, generated in the source directory if None
+    # Contents of the CSLMapView configuration file used by the job.
+    # If None, the file next to the executable is read when the job starts.
+    config: bytes = None
+    # Preset objects, each rendered to its own video from the same files.
+    # If empty, one video is created with the configuration of the job.
+    presets: tuple = ()
+    # "saves": one frame for each save, "game_time": frames follow the in-game time at a constant pace
+    timing: str = "saves"
+    # In-game seconds between frames with "game_time" timing.
+    # If None, the video has as many frames as there are saves.
+    frame_interval: float = None
+    # Change (mean pixel difference, 0-255) a frame needs compared to the last shown one to be shown.
+    # Quiet periods are sped up, at most constants.MAX_RAMP_STRIDE times. 0 shows every frame.
+    speed_ramp: float = 0
+    # Number of video frames for each shown frame, the ones in between are blended.
+    # The video plays at fps, so the shown frames change interpolate times slower.
+    interpolate: int = 1
+    motion_blend: bool = False  # Follow the optical flow when blending
+    overlays: tuple = ()  # Overlay objects drawn onto the frames
+    rotation: int = 0  # Clockwise rotation of the video in degrees, one of 0, 90, 180 and 270
+    # Width:height of the video, the square images are cropped to it
+    aspect_ratio: str = "1:1"
+    # Position of the crop, 0 is centered, -1 is the left or top edge, 1 is the right or bottom edge
+    offset: float = 0.0
+    # Widths of additional, smaller videos downscaled from the images rendered at width
+    ladder: tuple = ()
+    # If positive, a draft video of this many evenly spaced frames is made,
+    # its images are kept for later exports with the same settings
+    draft: int = 0
+    # Render the saves in bisection order and update a draft video of the rendered ones after each level
+    progressive: bool = False
+
+
+class Preset(NamedTuple):
+    """Named set of CSLMapView settings, rendered to a separate video."""
+    name: str
+    settings: dict  # Values by xml path, applied over the configuration of the job
+
+
+class Overlay(NamedTuple):
+    """Text or image drawn onto every frame of the video."""
+    # "date": in-game date of the save, value is the strftime format
+    # "population": population of the city, value is the label before it
+    # "text": the text in value, "image": the image file at value
+    kind: str
+    value: str = None
+    position: str = "bottom-left"  # One of constants.OVERLAY_POSITIONS
+    size: float = constants.DEFAULT_OVERLAY_SIZE  # Height relative to the height of the video
+
+
+class Output():
+    """One video created by an export process and the images it is made of."""
+
+    def __init__(self, name: str, folder: Path, runtime_exe: Path, out_file: str):
+        self.name = name  # Name of the preset, None if the job has no presets
+        self.folder = folder  # Path type, where the images are exported
+        self.runtime_exe = runtime_exe  # CSLMapView with the configuration of the preset
+        self.out_file = out_file  # Name of the video file
+        self.ladder_files = {}  # Names of the downscaled video files by width
+        self.progress_file = None  # Name of the video of the images rendered so far
+        self.images = {}  # Exported image files by the index of their source among the raw files
+        self.cache_folder = None  # Path type, where the images of drafts rendered with the same settings are kept
+
+    def frames(self, sources: List[int]) -> List[Tuple[int, str]]:
+        """Return the source index and the image file of the frames of the video in order.
+
+        Frame n shows the image of the raw file sources[n],
+        frames whose image could not be exported are left out.
+        """
+        return [(source, self.images[source]) for source in sources if source in self.images]
+
+    def cache_file(self, digest: str) -> Path:
+        """Return where the image of the save with the content hash digest is cached, None if it can not be."""
+        if self.cache_folder is None or digest is None:
+            return None
+        return Path(self.cache_folder, f"{digest}.png")
+
+
+class Rung_writer(threading.Thread):
+    """Thread downscaling frames to one size of a resolution ladder and encoding them."""
+
+    def __init__(self, writer: cv2.VideoWriter, size: Tuple[int, int]):
+        threading.Thread.__init__(self, name=f"Encoder-{size[0]}", daemon=True)
+        self.writer = writer
+        self.size = size
+        self.queue = queue.Queue(maxsize=constants.LADDER_QUEUE_SIZE)
+        self.error = None  # Exception raised while encoding
+
+    def put(self, image: np.ndarray) -> None:
+        """Queue a frame to be encoded, raise the exception of encoding if there was one."""
+        if self.error is not None:
+            raise self.error
+        self.queue.put(image)
+
+    def run(self) -> None:
+        import cv2
+        while True:
+            image = self.queue.get()
+            if image is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.writer.write(cv2.resize(
+                    image, self.size, interpolation=cv2.INTER_AREA))
+            except Exception as e:
+                self.error = e
+
+    def finish(self) -> None:
+        """Encode the queued frames and close the video file."""
+        try:
+            self.queue.put(None)
+            self.join()
+        finally:
+            self.writer.release()
+        if self.error is not None:
+            raise self.error
+
+
+class Export_listener():
+    """Interface for objects following the progress of an Exporter.
+
+    The methods may be called from any thread.
+    Override only the ones you are interested in.
+    """
+
+    def event(self, name: str, *args) -> None:
+        """Handle a change in the state of the export process.
+
+        Names used:
+            export_started: the export process started, duplicate saves are being searched
+            files_deduplicated: duplicate saves are found, exporting image files started
+            image_files_exported: all image files are exported, rendering video started
+            progress_video: the video of the images rendered so far is updated, the argument is the list of its files
+            exporting_done: the video is completed
+            abort: the export process has to be aborted
+        """
+        pass
+
+    def progress(self, stage: str, done: int, total: int) -> None:
+        """Handle progress of a stage ("scanning", "hashing", "exporting" or "rendering") of the export process."""
+        pass
+
+    def estimate(self, stage: str, per_minute: float, seconds_left: float) -> None:
+        """Handle the throughput and the estimated time left of the "exporting" or "rendering" stage.
+
+        Called before progress with the same stage.
+        """
+        pass
+
+    def ask_retry(self, message: str) -> bool:
+        """Return whether a failed operation described by message should be retried."""
+        return False
+
+
+def retry_on_fail(on_fail: Callable[[Exporter], None] = None) -> Callable:
+    """
+    Try running the method and ask the listeners when an exception occours.
+
+    The listeners may choose to retry the method or not,
+    in which case on_fail is called with the Exporter and None is returned.
+    """
+
+    def decorator(function: Callable[..., None]) -> Callable[..., None]:
+
+        @wraps(function)
+        def wrapper(self: Exporter, *args, **kwargs):
+            while True:
+                try:
+                    return function(self, *args, **kwargs)
+                except AbortException as e:
+                    self.log.exception("Aborting operation without asking")
+                    break
+                except Exception as e:
+                    if not self.ask_retry(f"An exception occoured:\n{str(e)}\nDo you want to retry?"):
+                        self.log.exception(
+                            "Not retrying operation after exception")
+                        break
+            if on_fail is not None:
+                on_fail(self)
+            return None
+        return wrapper
+
+    return decorator
+
+
+class Exporter():
+    """Class responsible for exporting images and assembling the video from them."""
+
+    def __init__(self, lock: threading.Lock = None, renderer: renderqueue.Render_queue = None, abort_event: threading.Event = None):
+        self.log = logging.getLogger("exporter")
+        self.lock = lock if lock is not None else threading.Lock()
+        # Render_queue executing the CSLMapView calls, may be shared with a preview
+        self.renderer = renderer if renderer is not None else renderqueue.Render_queue()
+        # Set when the export process has to stop
+        self.abort_event = abort_event if abort_event is not None else threading.Event()
+        self.listeners = []  # Export_listener objects notified about the progress
+        # Path type, the directory where cslmap files are loaded from
+        self.source_directory = None
+        self.city_name = None  # string, the name of the city
+        self.temp_folder = None  # Path type, the location where temporary files are created
+        self.exefile = None  # CSLMapView executable selected by the user
+        self.raw_files = []    # Collected cslmap files with matching city name
+        self.index = None  # scanner.Directory_index of the source directory
+        self.outputs = []  # Output objects of the current export, one for each preset
+        self.futures = []   # concurrent.futures.Future objects that are exporting images
+        # Index of the raw file rendered for each frame, duplicate saves share the image of an earlier one
+        self.sources = []
+        self.hashes = {}  # Content hashes of the raw files by their index
+        self.duplicates = 0  # Number of saves identical to the one before them
+        self.cached = 0  # Number of images taken from the images of earlier drafts
+        self.timings = timings.Export_timings()  # Durations of the stages of the current export
+        # Throughput of the stages of the current export, rendering includes decoding and encoding
+        self.throughput = {"exporting": timings.Throughput(), "rendering": timings.Throughput()}
+        self.report = None  # Summary of the timings of the last export, once it finished
+        self.rungs = []  # Rung_writer objects encoding the resolution ladder of the current output
+        self.metrics = metrics.Registry()  # Counters of the work done since the exporter was created
+        self.metrics.watch("cslapse_queue_depth",
+                           self.renderer.pending, queue="render")
+        self.metrics.watch("cslapse_queue_depth", lambda: sum(
+            [rung.queue.qsize() for rung in self.rungs]), queue="encode")
+        self.render_time = 0.0  # Seconds spent in CSLMapView in the current export
+        self.is_running = False  # If currently there is exporting going on
+        self.is_aborting = False  # If an abort pre=ocess is in progress
+        self.out_file = ""  # Name of output file, the last one if there are more
+        self.total = 0  # Number of images to export in the current export
+
+    def subscribe(self, listener: Export_listener) -> None:
+        """Notify listener about the progress of the export processes."""
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener: Export_listener) -> None:
+        """Stop notifying listener."""
+        self.listeners.remove(listener)
+
+    def notify(self, name: str, *args) -> None:
+        """Send an event to all listeners."""
+        for listener in self.listeners:
+            listener.event(name, *args)
+
+    def report_progress(self, stage: str, done: int, total: int) -> None:
+        """Send the progress of a stage to all listeners, with its throughput if it is known."""
+        estimate = self.throughput[stage].update(
+            done, total) if stage in self.throughput else None
+        for listener in self.listeners:
+            if estimate is not None:
+                listener.estimate(stage, *estimate)
+            listener.progress(stage, done, total)
+
+    def ask_retry(self, message: str) -> bool:
+        """Return True if any of the listeners wants to retry the failed operation."""
+        return any([listener.ask_retry(message) for listener in self.listeners])
+
+    def get_file(self, n: int) -> str:
+        """
+        Return the nth (0-indexed) file among the collected raw_files.
+
+        If there are not enough files, return an empty string.
+        """
+        if n >= len(self.raw_files):
+            return ""
+        else:
+            return self.raw_files[n]
+
+    def get_num_of_exported_files(self) -> int:
+        """Return the number of files exported in theis export process."""
+        with self.lock:
+            num = sum([len(output.images) for output in self.outputs])
+        return num
+
+    def get_num_of_video_frames(self) -> int:
+        """Return the number of frames encoded into the videos, repeated images counted each time."""
+        with self.lock:
+            num = sum([len(output.frames(self.sources)) for output in self.outputs])
+        return num
+
+    def get_summary(self) -> dict:
+        """Return statistics of the current export process.
+
+        The render time saved by reusing the frames of duplicate saves and the images
+        of earlier drafts is estimated from the average time of the rendered images.
+        The rate of frames, the stage that took the longest and the file of the
+        report are only known once the export finished.
+        """
+        # Cached images are counted among the exported ones, unless the outputs are cleaned up already
+        rendered = max(0, self.get_num_of_exported_files() - self.cached)
+        duplicates = self.duplicates * len(self.outputs)
+        average = self.render_time / rendered if rendered else 0
+        return {
+            "rendered": rendered,
+            "duplicates": duplicates,
+            "cached": self.cached,
+            "saved_render_hours": round((duplicates + self.cached) * average / 3600, 3),
+            "frames_per_minute": self.report["frames_per_minute"] if self.report else None,
+            "bottleneck": self.report["bottleneck"] if self.report else None,
+            "report": self.report.get("file") if self.report else None
+        }
+
+    def get_out_files(self) -> List[str]:
+        """Return the names of the video files of the current export process."""
+        return [file for output in self.outputs
+                for file in [output.out_file, *output.ladder_files.values()]]
+
+    def get_futures(self) -> List[concurrent.futures.Future]:
+        """Return future objects used for export."""
+        return self.futures
+
+    def can_abort(self) -> bool:
+        """Return if the export process can be aborted."""
+        return (not self.is_aborting) and self.is_running
+
+    def set_abort(self) -> None:
+        """Set variables to start aborting."""
+        self.is_aborting = True
+        self.isRunning = False
+        self.abort_event.set()
+
+    def clear_temp_folder(self) -> None:
+        """
+        Remove the all files from self.temp_folder, create Directory if doesn't exist.
+
+        The previews are kept, they may be rendered while an export starts.
+        If temp_folder is None, or doesnt exist, create the folder and return.
+        If the folder can not be cleared, ask the listeners whether to retry,
+        raise the exception if not.
+        """
+        while 1:
+            try:
+                with self.lock:
+                    self.temp_folder.mkdir(exist_ok=True)
+                    for entry in self.temp_folder.iterdir():
+                        if entry.name == constants.PREVIEW_FOLDER_NAME:
+                            continue
+                        if entry.is_dir():
+                            rmtree(entry, ignore_errors=False)
+                        else:
+                            entry.unlink()
+                self.metrics.set("cslapse_scratch_bytes", 0)
+                self.log.info("Tempfolder cleared or created successfully.")
+                return
+            except Exception as e:
+                self.log.exception(
+                    "Error while clearing / creating temp_folder.")
+                if not self.ask_retry(str(e)):
+                    raise
+
+    def get_preview_folder(self) -> Path:
+        """Return the folder previews are rendered to, apart from the images of the export."""
+        folder = Path(self.temp_folder, constants.PREVIEW_FOLDER_NAME)
+        folder.mkdir(exist_ok=True)
+        return folder
+
+    def set_sample_file(self, sample: str) -> None:
+        """Store city name and location of the sample file."""
+        sample_file = Path(sample)
+        self.source_directory = sample_file.parent
+        if self.temp_folder is not None and not self.is_running:
+            rmtree(self.temp_folder, ignore_errors=True)
+        # Unique, so that several exporters can run at the same time.
+        # Outside the source directory, so its modification time tells if there are new saves.
+        self.temp_folder = Path(tempfile.mkdtemp(
+            prefix=f"{constants.TEMP_FOLDER_PREFIX}{timestamp()}-"))
+        self.city_name = sample_file.stem.split("-")[0]
+        self.clear_temp_folder()
+
+    def set_exefile(self, exefile: str) -> None:
+        """Set the executable used for exporting to exefile."""
+        self.exefile = exefile
+
+    def collect_raw_files(self, filename: str) -> int:
+        """Make an array of files whose name matches the city's name and return its length.
+
+        The directory is scanned through its index, then the metadata of the files is read,
+        the progress of both is reported as stage "scanning". Files are ordered by their
+        in-game date if all of them have one, by their name otherwise.
+
+        Exceptions:
+            Raise AbortException if abort is requested
+        """
+        def progress(done: int, total: int) -> None:
+            if self.abort_event.is_set():
+                raise AbortException("Abort initiated on another thread.")
+            self.report_progress("scanning", done, total)
+
+        self.index = scanner.Directory_index(self.source_directory)
+        self.index.scan(progress)
+        names = [
+            name for name in self.index.names()
+            if name not in [f"{self.city_name}.cslmap", f"{self.city_name}.cslmap.gz"]
+            and name.startswith(self.city_name)
+        ]
+        try:
+            self.index.read_metadata(names, progress)
+        finally:
+            self.index.save()
+
+        game_times = [self.index.metadata(name)["game_time"] for name in names]
+        if names and None not in game_times:
+            names = [name for _, name in sorted(zip(game_times, names))]
+            self.log.info("Files ordered by in-game date")
+        self.raw_files = [Path(self.source_directory, name) for name in names]
+        return len(self.raw_files)
+
+    def get_metadata(self, file: Path) -> dict:
+        """Return the metadata of the collected file, None if it is not known."""
+        if self.index is None or Path(file).name not in self.index.entries:
+            return None
+        return self.index.metadata(Path(file).name)
+
+    def export_file(self, source_file: str, cmd: List[str], retry: int, folder: Path = None,
+                    on_attempt: Callable[[float, float, float], None] = None) -> str:
+        """Call CSLMapView to export one image file to folder and return outfile's name.
+
+        If folder is None, the image is exported to the temp folder.
+        on_attempt is called after every attempt with the time it started,
+        the time the process was spawned and the time it exited.
+
+        Exceptions:
+            Abortexpression: propagates
+            Cannot export file after [retry] tries: raises ExportError
+        """
+
+        # Prepare command that calls cslmapview.exe
+        new_file_name = Path(folder if folder is not None else self.temp_folder, source_file.stem.encode(
+            "ascii", "ignore").decode()).with_suffix(".png")
+        cmd[1] = str(source_file)
+        cmd[3] = str(new_file_name)
+
+        self.log.debug(f"Export of file '.../{source_file.name}' started")
+
+        # call CSLMapview.exe to export the image. Try again at fail, abort after many tries.
+        first = time.perf_counter()
+        for n in range(retry):
+            try:
+                # Call the program in a separate process
+                if n > 0:
+                    self.metrics.inc("cslapse_render_retries_total")
+                start = time.perf_counter()
+                self.metrics.inc("cslapse_active_renderers")
+                try:
+                    process = subprocess.Popen(cmd, shell=False, stderr=subprocess.DEVNULL,
+                                               stdout=subprocess.DEVNULL)
+                    spawned = time.perf_counter()
+                    process.wait()
+                finally:
+                    self.metrics.inc("cslapse_active_renderers", -1)
+                if on_attempt is not None:
+                    on_attempt(start, spawned, time.perf_counter())
+
+                # Return prematurely on abort
+                # Needs to be after export command, otherwise won't work. Probably dead Lock.
+                if self.abort_event.is_set():
+                    raise AbortException("Abort initiated on another thread.")
+
+                # Ensure that the image file was successfully created.
+                assert new_file_name.exists()
+
+                self.metrics.inc("cslapse_frames_rendered_total")
+                self.log.info("Exported file", extra={"data": {
+                    "file": source_file.name, "image": new_file_name.name, "attempts": n + 1,
+                    "seconds": round(time.perf_counter() - first, 3)}})
+                return str(new_file_name)
+            except AbortException as error:
+                self.log.exception(
+                    f"Aborted while exporting file '{new_file_name}'.")
+                raise AbortException from error
+            except subprocess.CalledProcessError as e:
+                self.log.exception(
+                    f"Process error while exporting file '{new_file_name}'.")
+                pass
+            except AssertionError as e:
+                self.log.warning(
+                    f"File '{new_file_name}' does not exist after exporting.")
+                pass
+            except Exception as e:
+                self.log.exception(
+                    f"Unknown exception while exporting file '{new_file_name}'.")
+                pass
+
+        self.log.warning(
+            f"Failed to export file after {retry} attempts with command '{' '.join(cmd)}'")
+
+        # Throw exception after repeatedly failing
+        self.metrics.inc("cslapse_frames_failed_total")
+        raise ExportError(str('Could not export file.\nCommand: "'
+                              + ' '.join(cmd)
+                              + '"\nThis problem might arise normally, usually when resources are taken.'))
+
+    def export(self, job: Export_job) -> bool:
+        """Start exporting on a new thread and return True if possible, False if exporting is already running."""
+        if self.is_running or self.is_aborting:
+            return False
+        job = self.prepare(job)
+        threading.Thread(
+            target=self.run,
+            args=(job,),
+            daemon=True
+        ).start()
+        return True
+
+    def prepare(self, job: Export_job) -> Export_job:
+        """Prepare variables and environment for exporting.
+
+        CSLMapView is mirrored into the temp folder with the configuration
+        of each preset of the job, so the settings can not change while the job is running.
+        Return the job with its length limited to the number of collected files
+        and the configuration it uses.
+
+        Exceptions:
+            Errors while preparing the environment: propagate, no export is running afterwards
+        """
+        length = len(self.raw_files) if job.length == 0 else min(
+            job.length, len(self.raw_files))
+        job = job._replace(length=length)
+        self.log.info(f"Exporting process initiated.")
+        self.is_running = True
+        self.is_aborting = False
+        self.abort_event.clear()
+        try:
+            check_presets(job.presets)
+            self.clear_temp_folder()
+            config = job.config if job.config is not None else runtime.read_config(
+                self.exefile)
+            job = job._replace(config=config)
+            self.outputs = [self.prepare_output(job, preset)
+                            for preset in job.presets or [Preset(None, {})]]
+        except Exception:
+            self.is_running = False
+            self.log.exception("Could not prepare the export.")
+            raise
+        self.futures = []
+        self.sources = list(range(length))
+        self.hashes = {}
+        self.cached = 0
+        self.timings = timings.Export_timings()
+        self.throughput = {"exporting": timings.Throughput(), "rendering": timings.Throughput()}
+        self.report = None
+        self.render_time = 0.0
+        self.total = length * len(self.outputs)
+        self.report_progress("exporting", 0, self.total)
+        self.report_progress("rendering", 0, self.total)
+        return job
+
+    def prepare_output(self, job: Export_job, preset: Preset) -> Output:
+        """Create the folder and the CSLMapView installation of preset and return its Output."""
+        city = self.city_name.encode("ascii", "ignore").decode()
+        if job.draft > 0:
+            city = f"{city}-draft"
+        if preset.name is None:
+            folder = self.temp_folder
+            out_file = str(job.out_file) if job.out_file is not None else str(
+                Path(self.source_directory, f"{city}-{timestamp()}.mp4"))
+            if job.out_file is not None and job.draft > 0:
+                out_file = str(Path(out_file).with_name(
+                    f"{Path(out_file).stem}-draft{Path(out_file).suffix}"))
+        else:
+            name = preset_file_name(preset.name)
+            folder = Path(self.temp_folder, name)
+            folder.mkdir()
+            if job.out_file is not None:
+                out_file = Path(job.out_file)
+                out_file = str(out_file.with_name(
+                    f"{out_file.stem}-{name}{'-draft' if job.draft > 0 else ''}{out_file.suffix}"))
+            else:
+                out_file = str(Path(self.source_directory,
+                               f"{city}-{name}-{timestamp()}.mp4"))
+        config = runtime.apply_settings(job.config, preset.settings)
+        runtime_exe = runtime.create_runtime(
+            self.exefile, Path(folder, "runtime"), config)
+        output = Output(preset.name, folder, runtime_exe, out_file)
+        output.progress_file = str(Path(out_file).with_name(
+            f"{Path(out_file).stem}-progress{Path(out_file).suffix}"))
+        # Images are only reused if they were rendered the same way
+        key = hashlib.sha1(
+            f"{Path(self.exefile).resolve()}|{job.width}|{job.areas}|".encode("utf-8") + (config or b""))
+        output.cache_folder = Path(
+            constants.FRAME_CACHE_FOLDER).expanduser() / key.hexdigest()
+        for width in job.ladder:
+            output.ladder_files[width] = str(Path(out_file).with_name(
+                f"{Path(out_file).stem}-{width}{Path(out_file).suffix}"))
+        return output
+
+    def run(self, job: Export_job) -> None:
+        """Export images and create video from them.
+
+        Exceptions:
+            Starting second export: warning
+            AbortException: propagates
+            Any other exception: the listeners are notified of an abort, propagates
+        """
+        try:
+            self.notify("export_started")
+            self.schedule_frames(job)
+            self.select_draft(job)
+            self.deduplicate(job)
+            self.notify("files_deduplicated")
+            self.log.info("Exporting image files started.")
+            self.export_image_files(job)
+            self.log.info("Exporting image files finished.")
+            self.notify("image_files_exported")
+            self.log.info("Rendering video started.")
+            self.render_video(job)
+            self.log.info("Rendering video finished.")
+            if job.progressive:
+                for output in self.outputs:
+                    Path(output.progress_file).unlink(missing_ok=True)
+            self.write_report()
+            self.notify("exporting_done")
+        except AbortException as e:
+            self.abort_event.set()
+            self.write_report()
+            self.notify("abort")
+            self.log.exception("Aborting export process due to AbortException")
+            raise
+        except Exception as e:
+            self.abort_event.set()
+            self.log.exception("Aborting export process due to an unexpected error")
+            self.write_report()
+            self.notify("abort")
+            raise
+
+    def write_report(self) -> None:
+        """Write the timings of the export to constants.REPORT_FOLDER and keep their summary.
+
+        Failing to write the report is not fatal.
+        """
+        self.report = self.timings.summary()
+        city = self.city_name.encode("ascii", "ignore").decode()
+        try:
+            self.report["file"] = str(self.timings.write(
+                Path(constants.REPORT_FOLDER).expanduser(), f"{city}-{timestamp()}"))
+        except OSError as e:
+            self.log.warning(f"Could not write the report of the export: {e}")
+        self.log.info(
+            f"{self.report['frames_per_minute']} frames per minute, bottleneck: {self.report['bottleneck']}")
+
+    def deduplicate(self, job: Export_job) -> None:
+        """Find the saves identical to the one shown on the frame before them, their frames reuse its image.
+
+        The contents of the files shown on the frames are hashed in parallel,
+        the hashes are cached in the index. The progress is reported as stage "hashing".
+
+        Exceptions:
+            Raise AbortException if abort is requested
+        """
+        def progress(done: int, total: int) -> None:
+            if self.abort_event.is_set():
+                raise AbortException("Abort initiated on another thread.")
+            self.report_progress("hashing", done, total)
+
+        if self.index is None:
+            return
+        indices = sorted(set(self.sources))
+        try:
+            hashes = self.index.hash_files(
+                [self.raw_files[i].name for i in indices], job.threads, progress)
+        finally:
+            self.index.save()
+        self.hashes = dict(zip(indices, hashes))
+
+        sources = []
+        for source in self.sources:
+            digest = self.hashes[source]
+            if sources and digest is not None and digest == self.hashes[sources[-1]]:
+                sources.append(sources[-1])
+            else:
+                sources.append(source)
+        self.duplicates = len(indices) - len(set(sources))
+        self.sources = sources
+        self.total = len(set(self.sources)) * len(self.outputs)
+        self.report_progress("exporting", 0, self.total)
+        self.log.info(f"{self.duplicates} duplicate saves found")
+
+    def get_game_times(self, files: List[Path]) -> List[float]:
+        """Return the in-game time of files in seconds.
+
+        If not all of the files have an in-game date, their modification time is used instead.
+        The times are made non-decreasing in the order of files.
+        """
+        metadata = [self.get_metadata(file) for file in files]
+        game_times = [meta.get("game_time") if meta is not None else None
+                      for meta in metadata]
+        if None not in game_times:
+            times = [datetime.fromisoformat(game_time).replace(tzinfo=timezone.utc).timestamp()
+                     for game_time in game_times]
+        else:
+            self.log.info("In-game dates missing, using modification times")
+            times = [self.index.entries[file.name]["mtime"] / 1e9
+                     if self.index is not None and file.name in self.index.entries
+                     else file.stat().st_mtime
+                     for file in files]
+        for i in range(1, len(times)):
+            times[i] = max(times[i], times[i - 1])
+        return times
+
+    def schedule_frames(self, job: Export_job) -> None:
+        """Map the frames of the video to saves according to the timing of job.
+
+        With "game_time" timing, each frame shows the latest save at its in-game time,
+        so saves are repeated or dropped to keep a constant pace. Dropped saves are not rendered.
+        The interval is adjusted so that the last frame shows the last save.
+        """
+        if job.timing != "game_time" or len(self.sources) < 2:
+            return
+        times = self.get_game_times(self.raw_files[:len(self.sources)])
+        span = times[-1] - times[0]
+        interval = job.frame_interval
+        if interval is None:
+            interval = span / (len(times) - 1)
+        if not interval > 0:
+            self.log.warning("No in-game time passed, timing of saves is used")
+            return
+        num_of_frames = max(2, round(span / interval) + 1)
+        if num_of_frames > constants.MAX_TIMED_FRAMES:
+            self.log.warning(
+                f"{num_of_frames} frames limited to {constants.MAX_TIMED_FRAMES}")
+            num_of_frames = constants.MAX_TIMED_FRAMES
+        interval = span / (num_of_frames - 1)
+        # Frames falling on the time of a save show it despite rounding errors
+        tolerance = span * 1e-9
+        self.sources = [
+            self.sources[bisect.bisect_right(times, times[0] + span * n / (num_of_frames - 1) + tolerance) - 1]
+            for n in range(num_of_frames - 1)
+        ] + [self.sources[-1]]
+        self.total = len(set(self.sources)) * len(self.outputs)
+        self.report_progress("exporting", 0, self.total)
+        self.log.info(
+            f"{num_of_frames} frames scheduled from {len(times)} saves at {interval} in-game seconds per frame")
+
+    def select_draft(self, job: Export_job) -> None:
+        """Keep job.draft evenly spaced frames, the first and the last one included, if the job is a draft."""
+        if not 0 < job.draft < len(self.sources):
+            return
+        last = len(self.sources) - 1
+        self.sources = [self.sources[round(n * last / max(1, job.draft - 1))]
+                        for n in range(job.draft)]
+        self.total = len(set(self.sources)) * len(self.outputs)
+        self.report_progress("exporting", 0, self.total)
+        self.log.info(f"Draft of {job.draft} frames selected")
+
+    def export_image_files(self, job: Export_job) -> None:
+        """Queue the collected cslmap files to be exported by CSLMapView as bulk jobs.
+
+        Duplicate saves are skipped, so are the ones rendered for an earlier draft with the same settings.
+        Every file is exported for every output, all of them sharing the workers
+        of the render queue. Preview requests submitted meanwhile
+        are served before the remaining files.
+        If the job is progressive, the files are queued in bisection order and a video of the
+        images rendered so far is written after each level, announced by the event "progress_video".
+
+        Exceptions:
+            Raise AbortException if abort is requested
+        """
+        cmd = [
+            "__exeFile__",
+            "__source_file__",
+            "-output",
+            "__outFile__",
+            "-silent",
+            "-imagewidth",
+            str(job.width),
+            "-area",
+            str(job.areas)
+        ]
+
+        self.renderer.set_workers(job.threads)
+        indices = sorted(set(self.sources))
+        levels = bisection_levels(len(indices)) if job.progressive else [
+            range(len(indices))]
+        level_ends = []  # Number of futures queued by the end of each level
+        for level in levels:
+            for i in [indices[position] for position in level]:
+                for output in self.outputs:
+                    cache_file = output.cache_file(self.hashes.get(i))
+                    if cache_file is not None and cache_file.exists():
+                        with self.lock:
+                            output.images[i] = str(cache_file)
+                        self.cached += 1
+                        continue
+                    cmd[0] = str(output.runtime_exe)
+                    self.futures.append(
+                        self.renderer.submit(
+                            self.export_image, output, i, cmd[:], job.retry,
+                            cache_file if job.draft > 0 else None, time.perf_counter(),
+                            priority=renderqueue.PRIORITY_BULK)
+                    )
+            level_ends.append(len(self.futures))
+        self.report_progress(
+            "exporting", self.get_num_of_exported_files(), self.total)
+        # The last level completes the export, its video is the final one
+        for level_end in level_ends[:-1]:
+            concurrent.futures.wait(self.futures[:level_end])
+            if self.abort_event.is_set():
+                raise AbortException("Abort initiated on another thread.")
+            self.notify("progress_video", self.write_progress_video(job))
+        concurrent.futures.wait(self.futures)
+        if self.abort_event.is_set():
+            raise AbortException("Abort initiated on another thread.")
+
+    def write_progress_video(self, job: Export_job) -> List[str]:
+        """Encode the images rendered so far into a video for each output and return the names of the videos.
+
+        Every rendered image is shown once, in the order of the saves. Failing to write a video is not fatal.
+        """
+        import cv2
+        files = []
+        for output in self.outputs:
+            with self.lock:
+                image_files = sorted(output.images.items())
+            if not image_files:
+                continue
+            out = cv2.VideoWriter(output.progress_file, cv2.VideoWriter_fourcc(*"mp4v"),
+                                  job.fps, self.crop_box(job)[2:])
+            try:
+                if not out.isOpened():
+                    raise ExportError("Could not open video file.")
+                for frame in self.process(job, self.decode(image_files)):
+                    out.write(frame.image)
+                files.append(output.progress_file)
+            except (ExportError, cv2.error) as e:
+                self.log.warning(
+                    f"Could not write video '{output.progress_file}': {e}")
+            finally:
+                out.release()
+        self.log.info(f"Video of {len(image_files)} rendered images written")
+        return files
+
+    @retry_on_fail()
+    def export_image(self, output: Output, index: int, cmd: List[str], retry: int,
+                     cache_file: Path = None, queued: float = None) -> None:
+        """Call the given command to export the indexth raw file, add filename to the images of output.
+
+        If cache_file is given, the image is copied there for later exports.
+        queued is the time the export was queued at, given by time.perf_counter.
+        This function should run on a separate thread for each file.
+
+        Exceptions:
+            AbortException: propagate
+            ExportError: non-fatal
+            Other exceptions: non-fatal
+        """
+        def on_attempt(start: float, spawned: float, end: float) -> None:
+            self.timings.add(output.name, index, spawn=spawned - start,
+                             render=end - spawned, attempts=1)
+            self.timings.span("render", start, end)
+            self.metrics.observe("cslapse_stage_seconds", spawned - start, stage="spawn")
+            self.metrics.observe("cslapse_stage_seconds", end - spawned, stage="render")
+
+        start = time.perf_counter()
+        if queued is not None:
+            self.timings.add(output.name, index, queue_wait=start - queued)
+            self.metrics.observe("cslapse_stage_seconds", start - queued, stage="queue_wait")
+        new_file_name = self.export_file(
+            self.raw_files[index], cmd, retry, output.folder, on_attempt)
+        size = os.path.getsize(new_file_name)
+        self.timings.add(output.name, index, png_bytes=size)
+        self.metrics.inc("cslapse_scratch_bytes", size)
+        with self.lock:
+            output.images[index] = new_file_name
+            self.render_time += time.perf_counter() - start
+        if cache_file is not None:
+            self.cache_image(new_file_name, cache_file)
+        self.report_progress(
+            "exporting", self.get_num_of_exported_files(), self.total)
+
+    def cache_image(self, image_file: str, cache_file: Path) -> None:
+        """Copy image_file to cache_file, replacing it at once. Failing to do so is not fatal."""
+        temp_file = cache_file.with_name(
+            f"{cache_file.stem}-{threading.get_ident()}.tmp")
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            copy2(image_file, temp_file)
+            os.replace(temp_file, cache_file)
+        except OSError as e:
+            self.log.warning(f"Could not cache image '{image_file}': {e}")
+            temp_file.unlink(missing_ok=True)
+
+    @retry_on_fail(lambda self: self.abort_event.set())
+    def prepare_video_file(self, size: Tuple[int, int], fps: int) -> cv2.VideoWriter:
+        """Create the video file self.out_file with the required parameters.
+
+        If the file can not be opened, the listeners are asked whether to retry.
+        Return None if they do not.
+        """
+        import cv2
+        writer = cv2.VideoWriter(
+            self.out_file,
+            cv2.VideoWriter_fourcc(*"mp4v"),
+            fps,
+            size
+        )
+        if not writer.isOpened():
+            writer.release()
+            raise ExportError(f"Could not open video file '{self.out_file}'.")
+        return writer
+
+    def crop_box(self, job: Export_job) -> Tuple[int, int, int, int]:
+        """Return the x, y, width and height of the part of the images shown in the video."""
+        return frames.crop_box(job.width, job.width, parse_aspect_ratio(job.aspect_ratio), job.offset)
+
+    def render_video(self, job: Export_job) -> None:
+        """Create an mp4 video file for each output from its exported images.
+
+        Exceptions:
+            Raise AbortException if abort is requested
+            AbortException: propagate
+        """
+        rendered = 0
+        total = self.get_num_of_video_frames()
+        self.report_progress("rendering", 0, total)
+        for output in self.outputs:
+            self.encode(job, output, rendered, total)
+            rendered += len(output.frames(self.sources))
+
+    def encode(self, job: Export_job, output: Output, rendered: int, total: int) -> None:
+        """Create the video files of output from its images.
+
+        The decoded frames stream through the processing stages of the job to the encoder.
+        The smaller videos of the resolution ladder are downscaled and encoded
+        on a thread each. rendered is the number of images decoded before
+        this output in the export process.
+
+        Exceptions:
+            Raise AbortException if abort is requested
+            AbortException: propagate
+            Cannot open video file: raise ExportError
+            Error of a ladder video: raised after all of them are closed, unless encoding failed
+        """
+        size = self.crop_box(job)[2:]
+        rungs = []
+        encoded = False
+        try:
+            for width, out_file in output.ladder_files.items():
+                self.out_file = out_file
+                rung_size = tuple([max(2, side * width // job.width // 2 * 2) for side in size])
+                writer = self.prepare_video_file(rung_size, job.fps)
+                if writer is None:
+                    raise ExportError(f"Could not open video file '{out_file}'.")
+                rungs.append(Rung_writer(writer, rung_size))
+                rungs[-1].start()
+            self.rungs = rungs
+
+            self.out_file = output.out_file
+            out = self.prepare_video_file(size, job.fps)
+            if out is None:
+                raise ExportError(f"Could not open video file '{output.out_file}'.")
+            try:
+                stream = self.decode(output.frames(self.sources), rendered, total, output)
+                for frame in self.process(job, stream):
+                    start = time.perf_counter()
+                    for rung in rungs:
+                        rung.put(frame.image)
+                    out.write(frame.image)
+                    end = time.perf_counter()
+                    self.timings.add(output.name, frame.source, encode=end - start)
+                    self.timings.span("encode", start, end)
+                    self.metrics.observe("cslapse_stage_seconds", end - start, stage="encode")
+                    self.metrics.inc("cslapse_frames_encoded_total")
+            finally:
+                out.release()
+                self.log.info(f"Released video file '{self.out_file}'")
+            encoded = True
+        except AbortException as e:
+            self.log.exception(
+                "Aborted rendering video due to AbortException.")
+            raise AbortException from e
+        finally:
+            self.rungs = []
+            errors = []
+            for rung in rungs:
+                try:
+                    rung.finish()
+                except Exception as e:
+                    self.log.exception(f"Could not finish the {rung.size[0]} pixels wide video.")
+                    errors.append(e)
+            # The exception of encoding, if any, is propagating already
+            if errors and encoded:
+                raise errors[0]
+
+    def decode(self, image_files: List[Tuple[int, str]], rendered: int = 0, total: int = None,
+               output: Output = None) -> Iterator[frames.Frame]:
+        """Read the images of the frames, given with the index of their source, one by one.
+
+        Consecutive frames of the same image share the decoded image.
+        The progress is reported as stage "rendering", unless total is None.
+        If output is given, the time of decoding is recorded for its frames.
+
+        Exceptions:
+            Raise AbortException if abort is requested
+            Cannot read image: non-fatal
+        """
+        import cv2
+
+        i = 0
+        img, img_file = None, None
+        while i < len(image_files):
+            if self.abort_event.is_set():
+                raise AbortException("Abort initiated on another thread.")
+            source, image_file = image_files[i]
+            try:
+                # Frames of duplicate saves share the image of the previous frame
+                if image_file != img_file:
+                    start = time.perf_counter()
+                    img, img_file = cv2.imread(image_file), image_file
+                    if output is not None:
+                        end = time.perf_counter()
+                        self.timings.add(output.name, source, decode=end - start)
+                        self.timings.span("decode", start, end)
+                        self.metrics.observe("cslapse_stage_seconds", end - start, stage="decode")
+                    if img is None:
+                        img_file = None
+                        raise ExportError(f"Could not read image '{image_file}'.")
+            except cv2.error as e:
+                if not self.ask_retry(str(e)):
+                    self.log.exception(
+                        f"Skipping image '{image_file}' after cv2 Exception.")
+                    i += 1
+                else:
+                    self.log.warning(
+                        f"Retrying adding image '{image_file}' to video after cv2 Exception.")
+                continue
+            except Exception as e:
+                if not self.ask_retry(str(e)):
+                    self.log.warning(
+                        f"Skipping image '{image_file}' after unknow Exception.")
+                    i += 1
+                else:
+                    self.log.warning(
+                        f"Retrying adding image '{image_file}' to video after unknown Exception.")
+                continue
+            i += 1
+            if total is not None:
+                self.report_progress("rendering", rendered + i, total)
+            yield frames.Frame(img, source)
+
+    def process(self, job: Export_job, stream: Iterator[frames.Frame]) -> Iterator[frames.Frame]:
+        """Return stream passed through the processing stages enabled in job."""
+        if job.rotation % 360 != 0:
+            stream = frames.rotate(stream, job.rotation)
+        box = self.crop_box(job)
+        if box[2:] != (job.width, job.width):
+            stream = frames.crop(stream, box)
+        if job.speed_ramp > 0:
+            stream = frames.speed_ramp(
+                stream, job.speed_ramp, constants.MAX_RAMP_STRIDE)
+        if job.interpolate > 1:
+            stream = frames.crossfade(stream, job.interpolate, job.motion_blend)
+        if job.overlays:
+            stream = frames.overlay(stream, [(self.overlay_sprites(job, overlay), overlay.position)
+                                             for overlay in job.overlays])
+        return stream
+
+    def overlay_sprites(self, job: Export_job, overlay: Overlay) -> Callable[[frames.Frame], frames.Sprite]:
+        """Return the function giving the sprite of overlay for a frame.
+
+        Sprites are rasterised once for each distinct text.
+        """
+        height = max(1, int(self.crop_box(job)[3] * overlay.size))
+        if overlay.kind == "image":
+            sprite = frames.image_sprite(str(overlay.value), height)
+            return lambda frame: sprite
+        if overlay.kind == "text":
+            sprite = frames.text_sprite(overlay.value, height)
+            return lambda frame: sprite
+
+        def metadata_sprite(frame: frames.Frame) -> frames.Sprite:
+            metadata = self.get_metadata(self.raw_files[frame.source]) or {}
+            if overlay.kind == "date" and metadata.get("game_time") is not None:
+                text = datetime.fromisoformat(metadata["game_time"]).strftime(
+                    overlay.value or constants.DEFAULT_DATE_FORMAT)
+            elif overlay.kind == "population" and metadata.get("population") is not None:
+                text = f"{overlay.value or ''}{metadata['population']}"
+            else:
+                return None
+            return frames.text_sprite(text, height)
+        return metadata_sprite
+
+    def cleanup(self) -> None:
+        """Clean up after exporting and/or aborting."""
+        self.clear_temp_folder()
+        self.outputs = []
+        self.futures = []
+        self.sources = []
+        self.hashes = {}
+        self.is_running = False
+        self.is_aborting = False
+        self.log.info("Successful cleanup after export or abort.")
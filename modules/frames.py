@@ -0,0 +1,265 @@
+from __future__ import annotations
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Tuple, Callable, NamedTuple, TYPE_CHECKING
+
+from . import constants
+
+if TYPE_CHECKING:
+    # Imported on demand, loading OpenCV and NumPy is slow and only needed for encoding
+    import numpy as np
+
+"""
+Module responsible for processing the frames of the video between decoding and encoding.
+
+Every stage is a generator taking and yielding Frame objects,
+so the frames stream through the stages one by one
+and only a few of them are held in memory at a time.
+"""
+
+
+class Frame(NamedTuple):
+    """One decoded frame of the video."""
+    # BGR image, may be shared between consecutive frames, stages must not modify it in place
+    image: np.ndarray
+    source: int  # Index of the raw file shown on the frame
+
+
+def thumbnail(image: np.ndarray) -> np.ndarray:
+    """Return a small grayscale copy of image for analysis.
+
+    Every few pixels are skipped before averaging, as reading the whole frame costs more than the rest.
+    """
+    import cv2
+    height, width = image.shape[:2]
+    step = max(1, width // (constants.ANALYSIS_WIDTH * 4))
+    size = (constants.ANALYSIS_WIDTH, max(
+        1, height * constants.ANALYSIS_WIDTH // width))
+    return cv2.cvtColor(
+        cv2.resize(image[::step, ::step], size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+
+def change_score(a: np.ndarray, b: np.ndarray) -> float:
+    """Return the mean absolute difference of two thumbnails."""
+    import cv2
+    return float(cv2.absdiff(a, b).mean())
+
+
+def speed_ramp(frames: Iterable[Frame], threshold: float, max_stride: int) -> Iterator[Frame]:
+    """Drop frames of quiet periods.
+
+    A frame is kept if it changed at least threshold compared to the last kept frame,
+    or if the max_stride - 1 frames before it were dropped. Busy periods stay at full speed,
+    quiet ones are sped up at most max_stride times. The first and the last frames are kept.
+    """
+    last_kept = None  # Thumbnail of the last kept frame
+    dropped = None  # The last frame, if it was dropped
+    image, small = None, None
+    stride = 0
+    for frame in frames:
+        if frame.image is not image:
+            image, small = frame.image, thumbnail(frame.image)
+        stride += 1
+        if last_kept is None or stride >= max_stride or change_score(small, last_kept) >= threshold:
+            last_kept = small
+            dropped = None
+            stride = 0
+            yield frame
+        else:
+            dropped = frame
+    if dropped is not None:
+        yield dropped
+
+
+def _flow(a: np.ndarray, b: np.ndarray, size: tuple) -> np.ndarray:
+    """Return the optical flow from image a to image b in pixels of the given (width, height).
+
+    The flow is computed on thumbnails and scaled up.
+    """
+    import cv2
+    small_a, small_b = thumbnail(a), thumbnail(b)
+    flow = cv2.calcOpticalFlowFarneback(
+        small_a, small_b, None, 0.5, 3, 15, 3, 5, 1.2, 0)
+    flow *= size[0] / small_a.shape[1]
+    return cv2.resize(flow, size, interpolation=cv2.INTER_LINEAR)
+
+
+def _warp(image: np.ndarray, grid: np.ndarray, flow: np.ndarray, t: float) -> np.ndarray:
+    """Return image sampled at the positions of grid moved by t times flow."""
+    import cv2
+    maps = grid + flow * t
+    return cv2.remap(image, maps[..., 0], maps[..., 1], cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def crossfade(frames: Iterable[Frame], steps: int, motion: bool = False) -> Iterator[Frame]:
+    """Insert steps - 1 frames blended between each pair of consecutive different frames.
+
+    Consecutive frames of the same image are repeated instead of blended.
+    If motion is True, the images are warped along their optical flow before blending,
+    so moving content slides instead of fading.
+    """
+    import cv2
+    import numpy as np
+
+    previous = None
+    grid = None
+    for frame in frames:
+        if previous is not None:
+            yield previous
+            same = frame.image is previous.image
+            if not same and motion:
+                height, width = frame.image.shape[:2]
+                if grid is None or grid.shape[:2] != (height, width):
+                    grid = np.dstack(np.meshgrid(
+                        np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32)))
+                flow = _flow(previous.image, frame.image, (width, height))
+            for step in range(1, steps):
+                t = step / steps
+                if same:
+                    yield previous
+                elif motion:
+                    yield Frame(cv2.addWeighted(
+                        _warp(previous.image, grid, flow, -t), 1 - t,
+                        _warp(frame.image, grid, flow, 1 - t), t, 0), previous.source)
+                else:
+                    yield Frame(cv2.addWeighted(previous.image, 1 - t, frame.image, t, 0), previous.source)
+        previous = frame
+    if previous is not None:
+        yield previous
+
+
+class Sprite(NamedTuple):
+    """Pre-rasterised overlay, ready to be alpha blended onto frames."""
+    color: np.ndarray  # BGR premultiplied by alpha, uint16
+    inverse_alpha: np.ndarray  # 255 - alpha, uint16 with a single channel
+
+
+def _sprite(color: np.ndarray, alpha: np.ndarray) -> Sprite:
+    """Return the Sprite of a BGR image and its alpha mask."""
+    import numpy as np
+    alpha = alpha.astype(np.uint16)[..., np.newaxis]
+    return Sprite(color.astype(np.uint16) * alpha, 255 - alpha)
+
+
+@lru_cache(maxsize=constants.SPRITE_CACHE_SIZE)
+def text_sprite(text: str, height: int) -> Sprite:
+    """Return text as white letters with a black outline, height pixels tall."""
+    import cv2
+    import numpy as np
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    thickness = max(1, height // 12)
+    outline = thickness + max(2, height // 8)
+    scale = cv2.getFontScaleFromHeight(font, height, thickness)
+    (width, text_height), baseline = cv2.getTextSize(text, font, scale, thickness)
+    origin = (outline, outline + text_height)
+    shape = (text_height + baseline + 2 * outline, width + 2 * outline)
+    color = np.zeros((*shape, 3), np.uint8)
+    alpha = np.zeros(shape, np.uint8)
+    cv2.putText(alpha, text, origin, font, scale, 255, outline, cv2.LINE_AA)
+    cv2.putText(color, text, origin, font, scale,
+                (255, 255, 255), thickness, cv2.LINE_AA)
+    return _sprite(color, alpha)
+
+
+@lru_cache(maxsize=constants.SPRITE_CACHE_SIZE)
+def image_sprite(path: str, height: int) -> Sprite:
+    """Return the image file at path, scaled to height pixels, transparency kept."""
+    import cv2
+    import numpy as np
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError(f"Could not read overlay image '{path}'.")
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    width = max(1, image.shape[1] * height // image.shape[0])
+    image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    if image.shape[2] == 4:
+        return _sprite(image[..., :3], image[..., 3])
+    return _sprite(image, np.full(image.shape[:2], 255, np.uint8))
+
+
+def blend(image: np.ndarray, sprite: Sprite, x: int, y: int) -> None:
+    """Alpha blend sprite onto image in place with its top left corner at (x, y).
+
+    Parts of the sprite outside of the image are cut off.
+    """
+    height, width = image.shape[:2]
+    sprite_height, sprite_width = sprite.inverse_alpha.shape[:2]
+    left, top = max(x, 0), max(y, 0)
+    right, bottom = min(x + sprite_width, width), min(y + sprite_height, height)
+    if left >= right or top >= bottom:
+        return
+    region = image[top:bottom, left:right]
+    cut = (slice(top - y, bottom - y), slice(left - x, right - x))
+    region[...] = (region * sprite.inverse_alpha[cut]
+                   + sprite.color[cut] + 127) // 255
+
+
+def overlay(frames: Iterable[Frame], layers: List[Tuple[Callable[[Frame], Sprite], str]]) -> Iterator[Frame]:
+    """Draw sprites onto the frames.
+
+    layers are pairs of a function returning the sprite of a frame (or None to draw nothing)
+    and the corner it is drawn at: "top-left", "top-right", "bottom-left" or "bottom-right".
+    Sprites in the same corner are stacked in the order of the layers.
+    """
+    for frame in frames:
+        image = frame.image.copy()
+        height, width = image.shape[:2]
+        margin = int(width * constants.OVERLAY_MARGIN)
+        offsets = dict.fromkeys(constants.OVERLAY_POSITIONS, margin)
+        for get_sprite, position in layers:
+            sprite = get_sprite(frame)
+            if sprite is None:
+                continue
+            sprite_height, sprite_width = sprite.inverse_alpha.shape[:2]
+            vertical, horizontal = position.split("-")
+            x = margin if horizontal == "left" else width - margin - sprite_width
+            if vertical == "top":
+                y = offsets[position]
+            else:
+                y = height - offsets[position] - sprite_height
+            offsets[position] += sprite_height
+            blend(image, sprite, x, y)
+        yield Frame(image, frame.source)
+
+
+def rotate(frames: Iterable[Frame], degrees: int) -> Iterator[Frame]:
+    """Rotate the frames clockwise by degrees, a multiple of 90.
+
+    OpenCV transposes and flips in a single pass into a contiguous array, the way the
+    encoder needs it. A strided view would be copied by every later OpenCV call instead.
+    Consecutive frames of the same image share the rotated image.
+    """
+    import cv2
+    code = {90: cv2.ROTATE_90_CLOCKWISE, 180: cv2.ROTATE_180,
+            270: cv2.ROTATE_90_COUNTERCLOCKWISE}[degrees % 360]
+    image, rotated = None, None
+    for frame in frames:
+        if frame.image is not image:
+            image, rotated = frame.image, cv2.rotate(frame.image, code)
+        yield Frame(rotated, frame.source)
+
+
+def crop_box(width: int, height: int, aspect: float, offset: float = 0.0) -> Tuple[int, int, int, int]:
+    """Return the x, y, width and height of the largest box with the aspect ratio (width / height) in the image.
+
+    The box is centered if offset is 0. Along the cropped side, -1 moves it
+    to the start (left or top) and 1 to the end of the image. The sides are even, as encoders need.
+    """
+    if aspect >= width / height:
+        box_width, box_height = width, int(width / aspect)
+    else:
+        box_width, box_height = int(height * aspect), height
+    box_width, box_height = max(2, box_width - box_width % 2), max(2, box_height - box_height % 2)
+    x = int((width - box_width) / 2 * (1 + offset))
+    y = int((height - box_height) / 2 * (1 + offset))
+    return x, y, box_width, box_height
+
+
+def crop(frames: Iterable[Frame], box: Tuple[int, int, int, int]) -> Iterator[Frame]:
+    """Cut the box given by x, y, width and height out of the frames.
+
+    The frames are views into the original images, no pixels are copied.
+    """
+    x, y, width, height = box
+    for frame in frames:
+        yield Frame(frame.image[y:y + height, x:x + width], frame.source)
@@ -0,0 +1,144 @@
+import os
+import sys
+import json
+import queue
+import logging
+import logging.handlers
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+from . import constants
+
+"""
+Module responsible for writing the logs of CSLapse.
+
+The loggers only put their records into a queue, a single background thread
+formats them and writes them to the log file, so the render workers never
+wait for the disk or for each other. Every run gets its own log file of JSON lines,
+older files are deleted once they take too much space.
+"""
+
+# Level of each logger used by CSLapse
+LOGGERS = {
+    "app": logging.INFO,
+    "root": logging.INFO,
+    "exporter": logging.INFO,
+    "window": logging.INFO,
+    "xmlparser": logging.DEBUG
+}
+
+_running = []  # Started and not yet stopped Log_listener objects
+
+
+class Json_formatter(logging.Formatter):
+    """Formats records as JSON objects, one per line.
+
+    Structured fields are given to the logging call as extra={"data": {...}}.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        entry.update(getattr(record, "data", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class Queue_handler(logging.handlers.QueueHandler):
+    """QueueHandler leaving all formatting to the listener thread.
+
+    The queue never leaves the process, so the records need not be made picklable.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class Log_listener(logging.handlers.QueueListener):
+    """QueueListener that detaches its queue from the loggers when stopped."""
+
+    def __init__(self, records: queue.SimpleQueue, *handlers: logging.Handler):
+        super().__init__(records, *handlers, respect_handler_level=True)
+        self.queue_handler = Queue_handler(records)
+
+    def start(self) -> None:
+        """Start writing the records on a background thread."""
+        super().start()
+        _running.append(self)
+
+    def stop(self) -> None:
+        """Write the remaining records and close the handlers."""
+        logging.getLogger().removeHandler(self.queue_handler)
+        super().stop()
+        _running.remove(self)
+        for handler in self.handlers:
+            handler.close()
+
+
+def threads() -> List[threading.Thread]:
+    """Return the threads writing the logs, they only finish when their listener is stopped."""
+    return [listener._thread for listener in _running if listener._thread is not None]
+
+
+def prune(folder: Path) -> None:
+    """Delete the oldest log files in folder until the rest fits constants.LOG_RETENTION_BYTES.
+
+    Failing to delete a file is not fatal.
+    """
+    files = []
+    for file in Path(folder).glob("cslapse-*.log*"):
+        try:
+            files.append((file.stat().st_mtime, file.stat().st_size, file))
+        except OSError:
+            continue
+    used = 0
+    for _, size, file in sorted(files, reverse=True):
+        used += size
+        if used > constants.LOG_RETENTION_BYTES:
+            try:
+                file.unlink()
+            except OSError:
+                pass
+
+
+def start(debug: bool = False, console: bool = False, folder: Path = None) -> Log_listener:
+    """Route the records of LOGGERS through a queue to a new log file and return the running listener.
+
+    The file is created in folder, constants.LOG_FOLDER by default. If debug is True,
+    debug records are written as well. If console is True, the records are also
+    printed to stderr. Call stop on the listener to write the remaining records before exiting.
+    """
+    folder = Path(folder if folder is not None else Path(
+        constants.LOG_FOLDER).expanduser())
+    folder.mkdir(parents=True, exist_ok=True)
+    file = Path(folder, f"cslapse-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.log")
+    prune(folder)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        file, maxBytes=constants.LOG_FILE_MAX_BYTES, backupCount=constants.LOG_FILE_BACKUPS, encoding="utf-8")
+    file_handler.setFormatter(Json_formatter())
+    file_handler.setLevel(logging.DEBUG if debug else logging.INFO)
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s [%(name)s/%(threadName)s] %(message)s"))
+        console_handler.setLevel(logging.DEBUG if debug else logging.INFO)
+        handlers.append(console_handler)
+
+    listener = Log_listener(queue.SimpleQueue(), *handlers)
+    # All loggers propagate to the root logger, "root" is the root logger itself from Python 3.9
+    logging.getLogger().addHandler(listener.queue_handler)
+    for name, level in LOGGERS.items():
+        logging.getLogger(name).setLevel(level)
+    listener.start()
+    logging.getLogger("root").info(f"Logging to '{file}'")
+    return listener
@@ -0,0 +1,108 @@
+import queue
+import threading
+import time
+import logging
+import tkinter
+from typing import Any, Callable, Dict
+
+from . import constants
+
+"""
+Module responsible for passing messages from worker threads to the GUI.
+
+Tkinter objects must only be touched from the main thread,
+so worker threads post messages that are handled by the Tk loop.
+The loop is woken by a virtual event only when a message arrives.
+"""
+
+
+class Message_queue():
+    """Thread-safe queue of messages that are handled on the Tk main thread.
+
+    Messages are handled in the order they were posted.
+    Progress values are coalesced and applied at most
+    constants.PROGRESS_REFRESH_RATE times a second.
+    """
+
+    EVENT = "<<Message>>"
+
+    def __init__(self, root: tkinter.Tk, handlers: Dict[str, Callable[..., None]], progress: Callable[[str, Any], None]):
+        self.log = logging.getLogger("root")
+        self.root = root
+        self._handlers = handlers
+        self._apply_progress = progress
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._wake_pending = False
+        self._progress = {}
+        self._progress_pending = False
+        self._flush_scheduled = False
+        self._last_flush = 0.0
+        self._interval = 1 / constants.PROGRESS_REFRESH_RATE
+
+        self.root.bind(self.EVENT, self._process)
+
+    def post(self, name: str, *args: Any) -> None:
+        """Post a message to be handled by the handler registered for name.
+
+        May be called from any thread.
+        """
+        self._queue.put((name, args))
+        with self._lock:
+            if self._wake_pending:
+                return
+            self._wake_pending = True
+        self._wake()
+
+    def progress(self, name: str, value: Any) -> None:
+        """Set the progress value called name. Only the latest value is applied.
+
+        May be called from any thread.
+        """
+        with self._lock:
+            self._progress[name] = value
+            if self._progress_pending:
+                return
+            self._progress_pending = True
+        self._wake()
+
+    def _wake(self) -> None:
+        """Wake the Tk loop to process the messages."""
+        try:
+            self.root.event_generate(self.EVENT, when="tail")
+        except (tkinter.TclError, RuntimeError):
+            # The main loop is not running anymore, nobody to notify
+            self.log.warning("Could not wake main loop to handle messages.")
+
+    def _process(self, event: tkinter.Event = None) -> None:
+        """Handle all queued messages and schedule applying the progress values."""
+        with self._lock:
+            self._wake_pending = False
+            progress_pending = self._progress_pending
+
+        if not self._queue.empty():
+            # State changes must see the progress that happened before them
+            self._flush_progress()
+        while not self._queue.empty():
+            name, args = self._queue.get()
+            self._handlers[name](*args)
+
+        if progress_pending and not self._flush_scheduled:
+            delay = self._last_flush + self._interval - time.monotonic()
+            self._flush_scheduled = True
+            self.root.after(max(0, int(delay * 1000)), self._scheduled_flush)
+
+    def _scheduled_flush(self) -> None:
+        """Apply the progress values after the refresh interval passed."""
+        self._flush_scheduled = False
+        self._flush_progress()
+
+    def _flush_progress(self) -> None:
+        """Apply the latest progress values on the main thread."""
+        with self._lock:
+            values = self._progress
+            self._progress = {}
+            self._progress_pending = False
+        for name, value in values.items():
+            self._apply_progress(name, value)
+        self._last_flush = time.monotonic()
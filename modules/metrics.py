@@ -0,0 +1,150 @@
+import math
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Tuple
+
+from . import constants
+
+"""
+Module responsible for exposing the state of the exporter to monitoring systems.
+
+The exporter counts what it does in a Registry. Optionally, the registry is served
+over HTTP in the Prometheus text format, so long exports can be scraped
+like any other service. Only the standard library is used.
+"""
+
+# Type and help text of the metrics, by name
+METRICS = {
+    "cslapse_frames_rendered_total": ("counter", "Images rendered by CSLMapView."),
+    "cslapse_frames_failed_total": ("counter", "Images CSLMapView failed to render after all attempts."),
+    "cslapse_render_retries_total": ("counter", "Attempts of CSLMapView repeated after a failure."),
+    "cslapse_frames_encoded_total": ("counter", "Frames written to the videos."),
+    "cslapse_active_renderers": ("gauge", "CSLMapView processes running."),
+    "cslapse_queue_depth": ("gauge", "Jobs waiting in a queue."),
+    "cslapse_scratch_bytes": ("gauge", "Bytes of images in the temp folder of the export."),
+    "cslapse_stage_seconds": ("histogram", "Duration of a stage of one frame."),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Labels, extra: str = "") -> str:
+    """Return labels in the text format, extra is appended as is."""
+    parts = [f'{name}="{value}"' for name, value in labels] + ([extra] if extra else [])
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    """Return value in the text format."""
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry():
+    """Thread safe collection of the metrics in METRICS."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}  # Values of counters and gauges by name and labels
+        self.histograms = {}  # Bucket counts, sum and count of histograms by name and labels
+        self.watched = {}  # Functions returning the value of gauges by name and labels
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """Increase the counter or gauge called name by value."""
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        """Set the gauge called name to value."""
+        with self.lock:
+            self.values.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def watch(self, name: str, function: Callable[[], float], **labels: str) -> None:
+        """Read the gauge called name from function whenever the metrics are collected."""
+        with self.lock:
+            self.watched.setdefault(name, {})[tuple(sorted(labels.items()))] = function
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Add value to the histogram called name, its buckets are constants.LATENCY_BUCKETS."""
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = [[0] * len(constants.LATENCY_BUCKETS), 0.0, 0]
+            histogram = series[key]
+            for i, bound in enumerate(constants.LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def _read_watched(self) -> Dict[str, Dict[Labels, float]]:
+        """Return the current values of the watched gauges. Failing functions are skipped."""
+        with self.lock:
+            watched = {name: dict(series) for name, series in self.watched.items()}
+        values = {}
+        for name, series in watched.items():
+            for key, function in series.items():
+                try:
+                    values.setdefault(name, {})[key] = function()
+                except Exception as e:
+                    logging.getLogger("exporter").warning(f"Could not read metric {name}: {e}")
+        return values
+
+    def exposition(self) -> str:
+        """Return all metrics in the Prometheus text format."""
+        watched = self._read_watched()
+        lines = []
+        with self.lock:
+            for name, (kind, help_text) in METRICS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                if kind == "histogram":
+                    for key, (buckets, total, count) in sorted(self.histograms.get(name, {}).items()):
+                        for bound, bucket in [*zip(constants.LATENCY_BUCKETS, buckets), (math.inf, count)]:
+                            le = 'le="' + _number(bound) + '"'
+                            lines.append(f"{name}_bucket{_labels(key, le)} {bucket}")
+                        lines.append(f"{name}_sum{_labels(key)} {_number(total)}")
+                        lines.append(f"{name}_count{_labels(key)} {count}")
+                    continue
+                series = {**self.values.get(name, {}), **watched.get(name, {})}
+                if not series and kind == "counter":
+                    series = {(): 0}
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_labels(key)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves the exposition of the registry of the server at /metrics."""
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.exposition().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logging.getLogger("exporter").debug(f"Metrics request: {format % args}")
+
+
+def serve(registry: Registry, port: int, host: str = constants.METRICS_HOST) -> ThreadingHTTPServer:
+    """Serve registry at http://host:port/metrics on a daemon thread and return the server.
+
+    Port 0 picks a free port, see server.server_address. Call shutdown on the server to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, name="Metrics", daemon=True).start()
+    logging.getLogger("exporter").info(
+        f"Metrics served at http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+    return server
@@ -1,6 +1,5 @@
 import tkinter
 from tkinter import ttk
-from PIL import ImageTk, Image
 
 from pathlib import Path
 from .filemanager import resource_path
@@ -76,8 +75,13 @@ class Preview():
             """Raise the ourline above the object(s) given by tagorid on canvas."""
             self.canvas.tag_raise("printarea", tagorid)
 
-        def resize(self, exported_w: int, exported_h: int, exported_areas: float, new_areas: float) -> None:
-            """Resize the outline when the areas to be show chage."""
+        def resize(self, exported_w: int, exported_h: int, exported_areas: float, new_areas: float,
+                   aspect: float = 1.0, offset: float = 0.0) -> None:
+            """Resize the outline when the areas to be show chage.
+
+            The square of the areas is cropped to the aspect ratio of the video,
+            offset moves the crop the same way as in the video.
+            """
             wRatio = exported_w / exported_areas
             self.x_start = (exported_areas - new_areas) / 2 * wRatio
             self.width = wRatio * new_areas
@@ -86,6 +90,14 @@ class Preview():
             self.y_start = (exported_areas - new_areas) / 2 * hRatio
             self.height = hRatio * new_areas
 
+            if aspect >= self.width / self.height:
+                cropped_width, cropped_height = self.width, self.width / aspect
+            else:
+                cropped_width, cropped_height = self.height * aspect, self.height
+            self.x_start += (self.width - cropped_width) / 2 * (1 + offset)
+            self.y_start += (self.height - cropped_height) / 2 * (1 + offset)
+            self.width, self.height = cropped_width, cropped_height
+
         def move(self, canvas_w: int, canvas_h: int, image_x: int, image_y: int, scale_factor: float) -> None:
             """Move the printarea rectangle to the location of the preview image."""
             canvasTop = image_y + scale_factor * self.y_start
@@ -123,14 +135,20 @@ class Preview():
         self.imageHeight = 0  # Height of original image in pixels
         self.preview_image = None  # The image object shown on canvas
         self.image_source = None  # The image object loaded from the exported preview, unchanged
+        self.rotated_source = None  # image_source rotated as the video will be
+        self.rotation = 0  # Clockwise rotation of the video in degrees
+        self.aspect = 1.0  # Aspect ratio (width / height) of the video
+        self.offset = 0.0  # Position of the crop of the video, see Printarea.resize
+        self.currentAreas = 0  # Areas currently shown by the printarea
 
         self.previewAreas = 0  # Areas printed on the currently active preview image
         self.imageX = 0  # X Coordinate on canvas of pixel in top left of image
         self.imageY = 0  # Y Coordinate on canvas of pixel in top left of image
         self.scaleFactor = 1  # Conversion factor: canvas pixels / original image pixels
 
-        self.placeholderImage = ImageTk.PhotoImage(
-            Image.open(resource_path(default_image)))
+        # Tk can load png by itself, PIL is imported only when a preview is shown
+        self.placeholderImage = tkinter.PhotoImage(
+            file=resource_path(default_image))
         self.canvas.create_image(
             0, 0, image=self.placeholderImage, tags="placeholder")
 
@@ -146,6 +164,8 @@ class Preview():
 
     def resizeImage(self, newFactor: float) -> None:
         """Change the activeImage to one with the current scaleFactor, keep center pixel in center."""
+        from PIL import ImageTk
+
         self.imageX = self.fullWidth / 2 - \
             ((self.fullWidth / 2-self.imageX) / self.scaleFactor) * newFactor
         self.imageY = self.fullHeight / 2 - \
@@ -153,7 +173,7 @@ class Preview():
 
         self.scaleFactor = newFactor
 
-        self.preview_image = ImageTk.PhotoImage(self.image_source.resize(
+        self.preview_image = ImageTk.PhotoImage(self.rotated_source.resize(
             (int(self.imageWidth * self.scaleFactor), int(self.imageHeight * self.scaleFactor))))
         self.canvas.itemconfigure(self.activeImage, image=self.preview_image)
         self.canvas.moveto(self.activeImage, x=self.imageX, y=self.imageY)
@@ -178,12 +198,15 @@ class Preview():
 
     def justExported(self, image_source, exported_width: int, exported_areas: float, current_areas: float = None) -> None:
         """Show newly exported preview image."""
+        from PIL import ImageTk
+
         self.imageWidth = exported_width
         self.imageHeight = exported_width
         self.previewAreas = exported_areas
 
         self.image_source = image_source
-        self.preview_image = ImageTk.PhotoImage(image_source)
+        self.rotated_source = self._rotated(image_source)
+        self.preview_image = ImageTk.PhotoImage(self.rotated_source)
         if self.active:
             self.canvas.itemconfigure(
                 self.activeImage, image=self.preview_image)
@@ -201,6 +224,26 @@ class Preview():
         
         self.fitToCanvas()
 
+    def _rotated(self, image):
+        """Return image rotated by the rotation of the video."""
+        if self.rotation % 360 == 0:
+            return image
+        return image.rotate(-self.rotation, expand=True)
+
+    def set_framing(self, aspect: float, offset: float) -> None:
+        """Show the crop of the video with aspect ratio and offset on the printarea."""
+        self.aspect = aspect
+        self.offset = offset
+        if self.active:
+            self.update_printarea(self.currentAreas)
+
+    def set_rotation(self, degrees: int) -> None:
+        """Show the preview image rotated clockwise by degrees."""
+        self.rotation = degrees
+        if self.active:
+            self.rotated_source = self._rotated(self.image_source)
+            self.resizeImage(self.scaleFactor)
+
     def resized(self, event: tkinter.Event) -> None:
         """Handle change in the canvas's size."""
         if self.active:
@@ -246,7 +289,8 @@ class Preview():
         """Reflect change on preview canvas areas on printarea."""
         if self.active:
             if new_areas is not None:
+                self.currentAreas = new_areas
                 self.printarea.resize(
-                    self.imageWidth, self.imageHeight, self.previewAreas, new_areas)
+                    self.imageWidth, self.imageHeight, self.previewAreas, new_areas, self.aspect, self.offset)
             self.printarea.move(self.fullWidth, self.fullHeight,
                                 self.imageX, self.imageY, self.scaleFactor)
@@ -0,0 +1,136 @@
+import heapq
+import itertools
+import threading
+import concurrent.futures
+import logging
+from typing import Any, Callable, List
+
+"""
+Module responsible for scheduling CSLMapView calls.
+
+A single Render_queue is shared by the preview and the export process,
+so that they never compete for the CPU with separately created threads.
+"""
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+
+class Render_queue():
+    """Pool of worker threads executing render jobs in order of priority.
+
+    Jobs with PRIORITY_INTERACTIVE jump ahead of every queued bulk job.
+    One extra worker is reserved for interactive jobs, so a preview never
+    has to wait for an export frame to finish.
+    """
+
+    def __init__(self, workers: int = 1, reserved: int = 1):
+        self.log = logging.getLogger("root")
+        self._condition = threading.Condition()
+        self._heap = []
+        self._counter = itertools.count()
+        self._names = itertools.count()
+        self._workers = 0
+        self._threads = []
+        self._general = []  # Workers that serve jobs of any priority
+        self._shutdown = False
+
+        for _ in range(reserved):
+            self._start_worker(interactive_only=True)
+        self.set_workers(workers)
+        self.log.info("Render queue initiated.")
+
+    def _start_worker(self, interactive_only: bool) -> None:
+        """Start a new worker thread."""
+        thread = threading.Thread(
+            target=self._work,
+            args=(interactive_only,),
+            name=f"Renderer-{next(self._names)}",
+            daemon=True
+        )
+        self._threads.append(thread)
+        if not interactive_only:
+            self._general.append(thread)
+        thread.start()
+
+    def set_workers(self, workers: int) -> None:
+        """Set the number of workers serving jobs of any priority.
+
+        Additional workers are started when the number increases,
+        surplus workers exit after finishing their current job.
+        """
+        with self._condition:
+            old = self._workers
+            self._workers = max(1, workers)
+            for _ in range(old, self._workers):
+                self._start_worker(interactive_only=False)
+            self._condition.notify_all()
+
+    def submit(self, function: Callable[..., Any], *args: Any, priority: int = PRIORITY_BULK, **kwargs: Any) -> concurrent.futures.Future:
+        """Queue function to be called with the arguments and return its Future."""
+        future = concurrent.futures.Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Cannot submit job after shutdown.")
+            heapq.heappush(self._heap, (priority, next(
+                self._counter), future, function, args, kwargs))
+            self._condition.notify_all()
+        return future
+
+    def _next_job(self, interactive_only: bool) -> tuple:
+        """Return the next job this worker may run or None if it should exit.
+
+        Must be called with the condition acquired.
+        """
+        while True:
+            if self._shutdown:
+                return None
+            if not interactive_only and self._retire():
+                return None
+            if self._heap and (not interactive_only or self._heap[0][0] <= PRIORITY_INTERACTIVE):
+                return heapq.heappop(self._heap)
+            self._condition.wait()
+
+    def _retire(self) -> bool:
+        """Return True if the calling general worker is surplus and should exit."""
+        if len(self._general) > self._workers:
+            self._general.remove(threading.current_thread())
+            self._threads.remove(threading.current_thread())
+            return True
+        return False
+
+    def _work(self, interactive_only: bool) -> None:
+        """Run jobs from the queue until shutdown."""
+        while True:
+            with self._condition:
+                job = self._next_job(interactive_only)
+            if job is None:
+                return
+            _, _, future, function, args, kwargs = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def pending(self) -> int:
+        """Return the number of queued jobs that have not started yet."""
+        with self._condition:
+            return len(self._heap)
+
+    def threads(self) -> List[threading.Thread]:
+        """Return the worker threads of the queue."""
+        with self._condition:
+            return self._threads[:]
+
+    def shutdown(self) -> None:
+        """Cancel all queued jobs and stop the workers once the running jobs finished."""
+        with self._condition:
+            self._shutdown = True
+            for job in self._heap:
+                job[2].cancel()
+            self._heap = []
+            self._condition.notify_all()
+        self.log.info("Render queue shut down.")
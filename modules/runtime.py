@@ -0,0 +1,75 @@
+import os
+import shutil
+import logging
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from . import constants
+
+"""
+Module responsible for the isolated CSLMapView installations of export jobs.
+
+CSLMapView reads its configuration from the file next to the executable.
+Every export job gets its own copy of the installation with a snapshot
+of the configuration, so jobs with different settings can run at the
+same time and editing the settings does not affect running jobs.
+"""
+
+
+def _link_or_copy(source: str, destination: str) -> None:
+    """Hard link source to destination, copy it if linking is not possible."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def read_config(exefile: Path) -> bytes:
+    """Return the contents of the configuration file used by exefile, None if there is none."""
+    config_file = Path(Path(exefile).parent, constants.SETTINGS_FILE_NAME)
+    if not config_file.exists():
+        return None
+    return config_file.read_bytes()
+
+
+def apply_settings(config: bytes, settings: dict) -> bytes:
+    """Return config with the values of settings, given by xml path, replaced.
+
+    Raise ValueError if a setting is not found in config.
+    """
+    if not settings:
+        return config
+    if config is None:
+        raise ValueError("No configuration to apply the settings to.")
+    root = ET.fromstring(config)
+    for xmlpath, value in settings.items():
+        element = root.find(xmlpath)
+        if element is None:
+            raise ValueError(f"Setting '{xmlpath}' not found in the configuration.")
+        element.text = str(value).lower() if isinstance(value, bool) else str(value)
+    return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+
+def create_runtime(exefile: Path, directory: Path, config: bytes = None) -> Path:
+    """Mirror the installation of exefile into directory and return the path of the new executable.
+
+    Only the executable and the files next to it with a suffix in constants.RUNTIME_SUFFIXES
+    are mirrored, hard linked where possible. The executable may be in a folder of
+    unrelated files, such as Downloads. If config is given, it is written as the
+    configuration file of the new installation.
+    """
+    log = logging.getLogger("exporter")
+    exefile = Path(exefile)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    for entry in exefile.parent.iterdir():
+        if entry.name == constants.SETTINGS_FILE_NAME or not entry.is_file():
+            continue
+        if entry.name == exefile.name or entry.suffix.lower() in constants.RUNTIME_SUFFIXES:
+            _link_or_copy(entry, Path(directory, entry.name))
+
+    if config is not None:
+        Path(directory, constants.SETTINGS_FILE_NAME).write_bytes(config)
+    log.info(f"Runtime directory '{directory}' created for '{exefile}'")
+    return Path(directory, exefile.name)
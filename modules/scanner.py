@@ -0,0 +1,201 @@
+import os
+import zlib
+import json
+import hashlib
+import logging
+import concurrent.futures
+from pathlib import Path
+from typing import Callable, List
+
+from . import constants
+from . import cslmap
+
+"""
+Module responsible for listing the cslmap files of save directories.
+
+Listing a directory with tens of thousands of saves, especially on a network share,
+takes a long time. Every directory gets an index file in constants.INDEX_FOLDER
+with the names, sizes and modification times of its cslmap files,
+so only the entries that changed since the last scan need to be examined.
+The metadata read from the files is cached in the index as well.
+"""
+
+
+class Directory_index():
+    """Persistent index of the cslmap files in one directory."""
+
+    VERSION = 1
+
+    def __init__(self, directory: Path, index_folder: Path = None):
+        self.log = logging.getLogger("exporter")
+        self.directory = Path(directory).resolve()
+        key = hashlib.sha1(str(self.directory).encode("utf-8")).hexdigest()
+        self.file = Path(
+            index_folder if index_folder is not None else Path(
+                constants.INDEX_FOLDER).expanduser(),
+            f"{key}.json")
+        self.mtime = None  # Modification time of the directory at the last scan
+        self.entries = {}  # Dictionaries with the size and mtime of the files by name
+        self.changed = False  # If the index differs from its file
+        self._load()
+
+    def _load(self) -> None:
+        """Load the index from its file, start with an empty index if that is not possible."""
+        try:
+            with open(self.file, encoding="utf-8") as f:
+                data = json.load(f)
+            if data["version"] != self.VERSION or data["directory"] != str(self.directory):
+                raise ValueError("Index belongs to another version or directory.")
+            self.mtime = data["mtime"]
+            self.entries = data["entries"]
+        except FileNotFoundError:
+            self.log.info(f"No index for '{self.directory}' yet")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.log.warning(f"Index '{self.file}' ignored: {e}")
+
+    def save(self) -> None:
+        """Write the index to its file if it changed. Failing to do so is not fatal."""
+        if not self.changed:
+            return
+        data = {
+            "version": self.VERSION,
+            "directory": str(self.directory),
+            "mtime": self.mtime,
+            "entries": self.entries
+        }
+        temp_file = self.file.with_suffix(".tmp")
+        try:
+            self.file.parent.mkdir(parents=True, exist_ok=True)
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(temp_file, self.file)
+            self.changed = False
+        except OSError as e:
+            self.log.warning(f"Could not save index '{self.file}': {e}")
+            temp_file.unlink(missing_ok=True)
+
+    def scan(self, progress: Callable[[int, int], None] = None) -> None:
+        """Bring the index up to date with the directory.
+
+        If the directory did not change since the last scan, nothing is listed.
+        Otherwise the size and modification time of every file is compared to its entry,
+        so saves rewritten in place are noticed. Only the metadata of changed files is read again.
+        progress is called with the number of examined and all entries to examine,
+        it may raise an exception to stop the scan.
+        """
+        progress = progress or (lambda done, total: None)
+        mtime = os.stat(self.directory).st_mtime_ns
+        if mtime == self.mtime:
+            self.log.info(
+                f"Directory '{self.directory}' unchanged, {len(self.entries)} indexed files used")
+            progress(len(self.entries), len(self.entries))
+            return
+
+        with os.scandir(self.directory) as it:
+            listed = [entry for entry in it
+                      if ".cslmap" in entry.name and ".cslmap" in Path(entry.name).suffixes
+                      and entry.is_file()]
+        new_entries = {}
+        examined = 0
+        progress(examined, len(listed))
+        for entry in listed:
+            stat = entry.stat()
+            new_entries[entry.name] = self._updated(
+                entry.name, stat.st_size, stat.st_mtime_ns)
+            examined += 1
+            if examined % constants.SCAN_PROGRESS_STEP == 0:
+                progress(examined, len(listed))
+        progress(examined, len(listed))
+
+        self.log.info(
+            f"Directory '{self.directory}' scanned, {examined} files examined")
+        self.entries = new_entries
+        self.mtime = mtime
+        self.changed = True
+
+    def _updated(self, name: str, size: int, mtime: int) -> dict:
+        """Return the entry called name, reset if the file changed."""
+        entry = self.entries.get(name)
+        if entry is not None and entry["size"] == size and entry["mtime"] == mtime:
+            return entry
+        return {"size": size, "mtime": mtime}
+
+    def read_metadata(self, names: List[str], progress: Callable[[int, int], None] = None) -> None:
+        """Read the metadata of the files called names that is not in the index yet.
+
+        Many files are read in a process pool, as parsing is CPU bound.
+        progress is called with the number of read and all files to read,
+        it may raise an exception to stop reading.
+        """
+        progress = progress or (lambda done, total: None)
+        to_read = [name for name in names if "meta" not in self.entries[name]]
+        progress(0, len(to_read))
+        if not to_read:
+            return
+
+        paths = [Path(self.directory, name) for name in to_read]
+        if len(to_read) < constants.METADATA_POOL_THRESHOLD:
+            for done, (name, path) in enumerate(zip(to_read, paths), 1):
+                self.entries[name]["meta"] = cslmap.read_metadata(path)
+                progress(done, len(to_read))
+        else:
+            with concurrent.futures.ProcessPoolExecutor() as pool:
+                futures = {pool.submit(cslmap.read_metadata, path): name
+                           for name, path in zip(to_read, paths)}
+                try:
+                    for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                        self.entries[futures[future]]["meta"] = future.result()
+                        progress(done, len(to_read))
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        self.changed = True
+        self.log.info(f"Metadata of {len(to_read)} files read")
+
+    def hash_files(self, names: List[str], workers: int, progress: Callable[[int, int], None] = None) -> List[str]:
+        """Return the hashes of the contents of the files called names.
+
+        The files are checked for changes first, hashes not in the index
+        are computed on workers threads.
+        The hash of a file that can not be read is None.
+        progress is called with the number of hashed and all files to hash,
+        it may raise an exception to stop hashing.
+        """
+        progress = progress or (lambda done, total: None)
+        # Saves overwritten in place are not noticed by scan, a wrong hash would reuse a wrong frame
+        for name in names:
+            stat = os.stat(Path(self.directory, name))
+            entry = self._updated(name, stat.st_size, stat.st_mtime_ns)
+            if entry is not self.entries[name]:
+                self.entries[name] = entry
+                self.changed = True
+        to_hash = [name for name in names if "hash" not in self.entries[name]]
+        progress(0, len(to_hash))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(cslmap.content_hash, Path(self.directory, name)): name
+                       for name in to_hash}
+            try:
+                for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                    try:
+                        self.entries[futures[future]]["hash"] = future.result()
+                    except (OSError, EOFError, zlib.error) as e:
+                        self.log.warning(
+                            f"Could not hash '{futures[future]}': {e}")
+                    progress(done, len(to_hash))
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        if to_hash:
+            self.changed = True
+            self.log.info(f"{len(to_hash)} files hashed")
+        return [self.entries[name].get("hash") for name in names]
+
+    def metadata(self, name: str) -> dict:
+        """Return the metadata of the file called name, None if it is not read yet."""
+        return self.entries[name].get("meta")
+
+    def names(self) -> List[str]:
+        """Return the sorted names of the indexed files."""
+        return sorted(self.entries)
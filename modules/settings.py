@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 import xml.etree.ElementTree as ET
 from typing import NamedTuple, Any, List
@@ -26,7 +27,12 @@ class Local_setting(NamedTuple):
 
 
 class Settings():
-    """Class handling the external xml settings file."""
+    """Class handling the external xml settings file.
+
+    Settings are indexed by their xml path, there is at most one variable for each path.
+    The paths whose variable differs from the file are tracked,
+    so that writing only touches the changed elements.
+    """
 
     def __init__(self, file: Path = None):
         self.file = file
@@ -34,26 +40,49 @@ class Settings():
 
         self.tree = None
         self.root = None
+        self.settings = {}  # Local_setting objects by xml path
+        self._elements = {}  # Elements of the tree by xml path, None if not found
+        self._saved = {}  # Value of each setting in the file by xml path
+        self._traces = {}  # Trace callback names of the variables by xml path
+        self._dirty = set()  # Xml paths of settings that differ from the file
 
         if file is not None:
-            self.tree = ET.parse(self.file)
-            self.root = self.tree.getroot()
+            self._parse()
             self.log.info(f"Successfully connected settings file {self.file}")
         else:
             self.log.info("Initiated settings object with no file")
-        self.settings = []
-        self.state_changed = False
+
+    def _parse(self) -> None:
+        """Parse self.file and set every variable to the value found in it."""
+        self.tree = ET.parse(self.file)
+        self.root = self.tree.getroot()
+        self._elements = {}
+        self._saved = {}
+        for xmlpath in self.settings:
+            self._load(xmlpath)
+        self._dirty = set()
+
+    def _load(self, xmlpath: str) -> None:
+        """Look up the element of xmlpath and set its variable to the value in the file."""
+        element = self.tree.find(xmlpath)
+        self._elements[xmlpath] = element
+        if element is None:
+            self.log.warning(f"Setting {xmlpath} not found in {self.file}")
+            return
+        self._saved[xmlpath] = self._to_var(element.text)
+        self.settings[xmlpath].var.set(self._saved[xmlpath])
 
     def set_file(self, file: Path, save_changes: bool = False) -> bool:
         """
         Change the used file to file.
 
         If save_changes is True, write the changes to the old file before closing.
+        The variables are set to the values found in the new file.
         Return whether the file was successfully changed.
         """
         try:
             if save_changes:
-                if self.state_changed:
+                if self.has_state_changed():
                     if self.file is not None:
                         self.write()
                     else:
@@ -61,9 +90,7 @@ class Settings():
                             "Trying to save settings with no file")
             assert file.exists()
             self.file = file
-            self.tree = ET.parse(self.file)
-            self.root = self.tree.getroot()
-            self.state_changed = False
+            self._parse()
             self.log.info(f"Successfully connected settings file {self.file}")
             return True
         except Exception as e:
@@ -72,36 +99,71 @@ class Settings():
             raise
 
     def write(self) -> None:
-        """Write all local changes to the source file."""
-        if self.tree is not None:
-            for setting in self.settings:
-                self.tree.find(setting.xmlpath).text = self._to_xml(
-                    setting.var.get())
-            self.tree.write(self.file)
-            self.state_changed = False
-            self.log.info("Changes written to file")
-        else:
+        """Write the changed settings to the source file.
+
+        The file is replaced atomically, it is never left partially written.
+        """
+        if self.tree is None:
             self.log.warning("Trying to write with no file")
+            return
+        self.change_state()
+        if not self._dirty:
+            self.log.info("No changes to write")
+            return
+
+        for xmlpath in self._dirty:
+            self._elements[xmlpath].text = self._to_xml(
+                self.settings[xmlpath].var.get())
+        temp_file = Path(self.file.parent, f".{self.file.name}.tmp")
+        try:
+            self.tree.write(temp_file)
+            os.replace(temp_file, self.file)
+        except Exception:
+            temp_file.unlink(missing_ok=True)
+            raise
+        for xmlpath in self._dirty:
+            self._saved[xmlpath] = self.settings[xmlpath].var.get()
+        self.log.info(f"{len(self._dirty)} changes written to file")
+        self._dirty = set()
 
     def add_variable(self, var: Any, xmlpath: str, set_var: bool = False) -> None:
         """
         Add a variable to the settings that can be changed.
 
-        var must have a type that supports get() and set() methods
+        var must have a type that supports get() and set() methods.
+        If a variable is already registered for xmlpath, it is replaced.
 
         If set_var is set, set it to the value found in self.file.
         """
-        self.settings.append(Local_setting(var, xmlpath))
-        last_index = len(self.settings) - 1
-        if set_var:
-            self.settings[last_index].var.set(
-                self._to_var(self.get(last_index)))
+        self._remove_trace(xmlpath)
+        self.settings[xmlpath] = Local_setting(var, xmlpath)
+        self._dirty.discard(xmlpath)
+        if set_var and self.tree is not None:
+            self._load(xmlpath)
+        if hasattr(var, "trace_add"):
+            self._traces[xmlpath] = var.trace_add(
+                "write", lambda *args, path=xmlpath: self._update_dirty(path))
+
+    def _remove_trace(self, xmlpath: str) -> None:
+        """Stop tracking the changes of the variable registered for xmlpath."""
+        if xmlpath in self._traces:
+            self.settings[xmlpath].var.trace_remove(
+                "write", self._traces.pop(xmlpath))
+
+    def _update_dirty(self, xmlpath: str) -> None:
+        """Mark xmlpath dirty if its variable differs from the file, clean otherwise."""
+        if self._elements.get(xmlpath) is None:
+            return
+        if self.settings[xmlpath].var.get() != self._saved[xmlpath]:
+            self._dirty.add(xmlpath)
+        else:
+            self._dirty.discard(xmlpath)
 
-    def get(self, index: int) -> Any:
+    def get(self, xmlpath: str) -> Any:
         """
-        Return the value at the given index.
+        Return the value of the setting at xmlpath in the file.
         """
-        return self._to_var(self.tree.find(self.settings[index].xmlpath).text)
+        return self._saved.get(xmlpath)
 
     def _to_xml(self, setting: Any) -> str:
         """Change the given setting to the corresponding text in the xml file."""
@@ -112,21 +174,38 @@ class Settings():
         return setting
 
     def change_state(self) -> None:
-        """Signal that the state of some elements have been changed."""
-        self.state_changed = True
+        """Check all variables for changes.
+
+        Only needed for variables that can not be traced.
+        """
+        for xmlpath in self.settings:
+            if xmlpath not in self._traces:
+                self._update_dirty(xmlpath)
 
     def has_state_changed(self) -> bool:
         """Return whether the state of some elements is different from the xml file."""
-        return self.state_changed
+        self.change_state()
+        return len(self._dirty) > 0
 
 
 class Layout_loader():
-    """Class responsible for reading the layout of settings pages from the xml file."""
+    """Class responsible for reading the layout of settings pages from the xml file.
+
+    The file is parsed when the layout is first needed, not when the object is created.
+    """
 
     def __init__(self, file: Path):
         self.file = file
         self.log = logging.getLogger("xmlparser")
 
+        self.tree = None
+        self.root = None
+        self.pages = None
+
+    def _load(self) -> None:
+        """Parse the layout file if it has not been parsed yet."""
+        if self.tree is not None:
+            return
         self.tree = ET.parse(self.file)
         self.root = self.tree.getroot()
         self.log.info(f"Successfully connected layout file {self.file}")
@@ -134,9 +213,11 @@ class Layout_loader():
         self.pages = [page.get("name") for page in self.root]
 
     def get_page(self, key: str) -> ET.Element:
+        self._load()
         return self.root.find(f"page[@name='{key}']")
 
     def get_pages(self) -> List[str]:
+        self._load()
         return self.pages
 
 
@@ -0,0 +1,158 @@
+import csv
+import json
+import time
+import threading
+import collections
+from pathlib import Path
+from typing import List, Tuple
+
+from . import constants
+
+"""
+Module responsible for measuring where the time of an export goes.
+
+The exporter records the durations of the stages of every frame
+and the spans of the work done on each thread. After the export they are
+written as a JSON and a CSV report and a timeline in the Chrome trace format,
+which can be opened in chrome://tracing or Perfetto.
+"""
+
+# Columns of the report of the frames, all of them durations in seconds except the last two
+FRAME_FIELDS = ["queue_wait", "spawn", "render", "decode", "encode", "attempts", "png_bytes"]
+# Stages that run as spans on the timeline, the bottleneck is one of them
+SPAN_STAGES = ["render", "decode", "encode"]
+
+
+def _union(intervals: List[Tuple[float, float]]) -> float:
+    """Return the length of the time covered by at least one of the intervals."""
+    covered, end = 0.0, None
+    for start, stop in sorted(intervals):
+        if end is None or start > end:
+            covered += stop - start
+            end = stop
+        elif stop > end:
+            covered += stop - end
+            end = stop
+    return covered
+
+
+class Throughput():
+    """Thread safe moving average of the rate a stage of the export progresses at.
+
+    The rate is measured on the wall clock over the last constants.THROUGHPUT_WINDOW seconds,
+    so it reflects the number of workers and the time lost on retries.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = collections.deque()  # Times and numbers of done items
+
+    def update(self, done: int, total: int) -> Tuple[float, float]:
+        """Add the progress of the stage.
+
+        Return the items done per minute and the estimated seconds left, None if not known yet.
+        Progress of 0 starts the measurement over. Workers may report out of order,
+        progress below the latest one counts as the latest one.
+        """
+        now = time.perf_counter()
+        with self.lock:
+            if done == 0:
+                self.samples.clear()
+            elif self.samples:
+                done = max(done, self.samples[-1][1])
+            self.samples.append((now, done))
+            # Keep one sample older than the window, so the average spans all of it
+            while len(self.samples) > 2 and now - self.samples[1][0] >= constants.THROUGHPUT_WINDOW:
+                self.samples.popleft()
+            start, start_done = self.samples[0]
+        if now <= start or done <= start_done:
+            return None
+        rate = (done - start_done) / (now - start)
+        return rate * 60, max(0, total - done) / rate
+
+
+class Export_timings():
+    """Thread safe collection of the timings of one export."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.frames = {}  # Accumulated values of FRAME_FIELDS by output name and raw file index
+        self.spans = []  # Stage, thread name, start and end of the work done
+
+    def add(self, output: str, index: int, **values: float) -> None:
+        """Add values, given by field, to those of the frame of output showing the indexth raw file."""
+        with self.lock:
+            frame = self.frames.setdefault((output, index), {})
+            for field, value in values.items():
+                frame[field] = frame.get(field, 0) + value
+
+    def span(self, stage: str, start: float, end: float) -> None:
+        """Record that the current thread worked on stage from start to end, given by time.perf_counter."""
+        with self.lock:
+            self.spans.append(
+                (stage, threading.current_thread().name, start, end))
+
+    def summary(self) -> dict:
+        """Return the number of frames, their rate and the time spent in each stage.
+
+        The wall time of a stage is the time any thread worked on it.
+        The bottleneck is the stage with the most wall time.
+        """
+        with self.lock:
+            frames = dict(self.frames)
+            spans = self.spans[:]
+        seconds = time.perf_counter() - self.start
+        rendered = len([frame for frame in frames.values() if "render" in frame])
+        stages = {}
+        for field in FRAME_FIELDS[:5]:
+            stages[field] = {"total_seconds": round(
+                sum([frame.get(field, 0) for frame in frames.values()]), 3)}
+            if field in SPAN_STAGES:
+                stages[field]["wall_seconds"] = round(_union(
+                    [(start, end) for stage, _, start, end in spans if stage == field]), 3)
+        bottleneck = max(SPAN_STAGES, key=lambda stage: stages[stage]["wall_seconds"])
+        return {
+            "frames": rendered,
+            "seconds": round(seconds, 3),
+            "frames_per_minute": round(rendered * 60 / seconds, 1) if seconds else 0,
+            "retries": sum([frame.get("attempts", 1) - 1 for frame in frames.values() if "attempts" in frame]),
+            "png_bytes": sum([frame.get("png_bytes", 0) for frame in frames.values()]),
+            "stages": stages,
+            "bottleneck": bottleneck if stages[bottleneck]["wall_seconds"] > 0 else None
+        }
+
+    def trace(self) -> dict:
+        """Return the spans as a timeline in the Chrome trace event format, one row per thread."""
+        with self.lock:
+            spans = self.spans[:]
+        threads = {}
+        events = []
+        for stage, thread, start, end in spans:
+            tid = threads.setdefault(thread, len(threads))
+            events.append({"name": stage, "ph": "X", "pid": 0, "tid": tid,
+                           "ts": round((start - self.start) * 1e6), "dur": round((end - start) * 1e6)})
+        events += [{"name": "thread_name", "ph": "M", "pid": 0, "tid": tid, "args": {"name": thread}}
+                   for thread, tid in threads.items()]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, folder: Path, name: str) -> Path:
+        """Write the report and the timeline to folder, their names starting with name, and return the report file."""
+        folder = Path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            frames = sorted(self.frames.items(), key=lambda item: (str(item[0][0]), item[0][1]))
+        rows = [{"output": output, "index": index, **{field: round(values[field], 6)
+                                                      for field in FRAME_FIELDS if field in values}}
+                for (output, index), values in frames]
+
+        report = Path(folder, f"{name}-report.json")
+        with open(report, "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary(), "frames": rows}, f, indent=1)
+        with open(Path(folder, f"{name}-report.csv"), "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["output", "index", *FRAME_FIELDS])
+            writer.writeheader()
+            writer.writerows(rows)
+        with open(Path(folder, f"{name}-trace.json"), "w", encoding="utf-8") as f:
+            json.dump(self.trace(), f)
+        return report